@@ -0,0 +1,179 @@
+'''Benchmarks for the parse and calculation hot paths
+
+Usage: python bench/bench_hotpaths.py [--sizes 1000,100000,10000000] [--only NAME]... [--save] [--tolerance 0.25] [--min-rows 100000]
+
+Each benchmark runs over synthetic rows from synth.py and reports time,
+throughput and (for sizes up to --mem-limit) peak traced memory. Throughput is
+compared with bench/baseline.json and anything slower than the tolerance allows
+is flagged as a regression, with a non-zero exit status. --save records the
+current run as the new baseline. Baselines only mean something on the machine
+they were recorded on, so the file is kept out of the repository: run with
+--save before making a change and compare after. Sizes under --min-rows are
+reported but never flagged, they are over too quickly to time reliably.
+
+To keep memory flat at large sizes, inputs are a block of BLOCK_ROWS generated
+rows repeated as often as needed. calc_commission gets a fresh PersonalStats
+for every block, since repeated rows would otherwise be skipped as seen.
+'''
+from itertools import chain, cycle, islice, repeat
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'util'))
+
+import engine
+import synth
+from products import ProductCache
+from sales_lookup import iter_line_items
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BLOCK_ROWS = 10000
+TEXT_LIMIT = 1000000 # parse_table needs the whole text in memory, so it is skipped above this
+MIN_SECONDS = .2
+MIN_FLAG_ROWS = 100000
+
+
+class Block:
+	'''One block of generated rows in the forms the benchmarks need'''
+
+	def __init__(self):
+		self.lines = list(synth.generate_lines(BLOCK_ROWS))
+		self.items = [item for _, item in iter_line_items(self.lines)]
+		self.lines_per_row = len(self.lines) / len(self.items)
+		self.prices = [item.unit_price / 100 for item in self.items if item.unit_price >= 0]
+		self.descriptions = [item.description for item in self.items]
+		self.products = [(item.sku, item.description) for item in self.items]
+
+	def repeated_lines(self, n):
+		return islice(chain.from_iterable(repeat(self.lines)), int(n * self.lines_per_row))
+
+	def blocks(self, n):
+		'''Item lists adding up to n rows'''
+		full, rest = divmod(n, len(self.items))
+		return chain(repeat(self.items, full), [self.items[:rest]] if rest else [])
+
+# ----------------------------------------------------------- Benchmarks
+# Each takes the block and a row count and returns a callable that does the work
+
+def bench_parse_table(block, n):
+	if n > TEXT_LIMIT: return None
+	text = '\n'.join(block.repeated_lines(n))
+	return lambda: engine.parse_table(text)
+
+def bench_iter_line_items(block, n):
+	return lambda: sum(1 for _ in iter_line_items(block.repeated_lines(n)))
+
+def bench_get_commission_bucket(block, n):
+	return lambda: [engine.get_commission_bucket(price) for price in islice(cycle(block.prices), n)]
+
+def bench_is_service_plan(block, n):
+	return lambda: [engine.is_service_plan(description) for description in islice(cycle(block.descriptions), n)]
+
+def bench_product_cache(block, n):
+	cache = ProductCache()
+	return lambda: [cache.is_service_plan(sku, description) for sku, description in islice(cycle(block.products), n)]
+
+def bench_calc_commission(block, n):
+	def run():
+		for items in block.blocks(n): engine.calc_commission(items, (), engine.PersonalStats())
+	return run
+
+def bench_count_customers(block, n):
+	def run():
+		stats = engine.PersonalStats()
+		for items in block.blocks(n): engine.count_customers(items, stats)
+	return run
+
+BENCHMARKS = {
+	'parse_table': bench_parse_table,
+	'iter_line_items': bench_iter_line_items,
+	'get_commission_bucket': bench_get_commission_bucket,
+	'is_service_plan': bench_is_service_plan,
+	'product_cache': bench_product_cache,
+	'calc_commission': bench_calc_commission,
+	'count_customers': bench_count_customers,
+}
+
+def measure(run, repeat, trace_memory):
+	'''Returns (seconds, peak bytes or None) for run, taking the best of repeat calls
+
+	Fast runs are repeated until MIN_SECONDS have passed so small sizes aren't all noise.
+	'''
+	seconds = []
+	while len(seconds) < repeat or (sum(seconds) < MIN_SECONDS and len(seconds) < 1000):
+		start = time.perf_counter()
+		run()
+		seconds.append(time.perf_counter() - start)
+	seconds = min(seconds)
+
+	peak = None
+	if trace_memory:
+		tracemalloc.start()
+		run()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	return seconds, peak
+
+def load_baseline(path):
+	if not os.path.exists(path): return {}
+	with open(path) as f: return json.load(f)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the parse and calculation hot paths')
+	parser.add_argument('--sizes', default='1000,100000,10000000', help='comma separated row counts (default: %(default)s)')
+	parser.add_argument('--only', action='append', choices=BENCHMARKS, help='benchmark to run, may be repeated (default: all)')
+	parser.add_argument('--repeat', type=int, default=5, help='runs to take the best of, sizes of 1M rows and up run once (default: %(default)s)')
+	parser.add_argument('--mem-limit', type=int, default=1000000, help='largest size to trace peak memory for (default: %(default)s)')
+	parser.add_argument('--tolerance', type=float, default=.25, help='allowed throughput drop before flagging (default: %(default)s)')
+	parser.add_argument('--min-rows', type=int, default=MIN_FLAG_ROWS, help='smallest size to flag regressions for (default: %(default)s)')
+	parser.add_argument('--baseline', default=BASELINE_PATH)
+	parser.add_argument('--save', action='store_true', help='save this run as the baseline')
+	args = parser.parse_args(argv)
+
+	sizes = [int(size) for size in args.sizes.split(',')]
+	baseline = load_baseline(args.baseline)
+	block = Block()
+	results = {}
+	regressions = []
+
+	print(f'{"benchmark":<22} {"rows":>10} {"seconds":>9} {"rows/s":>12} {"peak KiB":>10} {"baseline":>12} {"change":>8}')
+	for name in args.only or BENCHMARKS:
+		for n in sizes:
+			run = BENCHMARKS[name](block, n)
+			if run is None: continue
+
+			seconds, peak = measure(run, args.repeat if n < 1000000 else 1, n <= args.mem_limit)
+			throughput = n / seconds if seconds else float('inf')
+			key = f'{name}/{n}'
+			results[key] = {'seconds': seconds, 'rows_per_second': throughput, 'peak_bytes': peak}
+
+			base = baseline.get(key, {}).get('rows_per_second')
+			change = f'{(throughput / base - 1) * 100:+.1f}%' if base else '-'
+			flag = ''
+			if base and n >= args.min_rows and throughput < base * (1 - args.tolerance):
+				flag = ' REGRESSION'
+				regressions.append(key)
+
+			peak_text = f'{peak / 1024:.0f}' if peak is not None else '-'
+			base_text = f'{base:.0f}' if base else '-'
+			print(f'{name:<22} {n:>10} {seconds:>9.3f} {throughput:>12.0f} {peak_text:>10} {base_text:>12} {change:>8}{flag}')
+
+	if args.save:
+		baseline.update(results)
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent='\t', sort_keys=True)
+			f.write('\n')
+
+	if regressions:
+		print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+		return 1
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,179 +1,155 @@
 import tkinter as tk
 import tkinter.messagebox
 from table import Table
-from math import inf
-from sys import exc_info
-
-COMMISSION_RATES = (.06, .03, .015)
-COMMISSION_RANGES = ((0, 9.99), (10, 99.99), (100, inf))
-OUT_OF_DEPT_RATE = .01
-SERVICE_PLAN_RATE = .1
-
-BUCKET_BREAKDOWN_COLS = ['6% Bracket', '3% Bracket', '1.5% Bracket', 'Out of Dept', 'Service Plans']
+from virtual_grid import VirtualGrid
+from background import Job
+from catalog import load_catalog
+from engine import PersonalStats, Results, explain_row
+from instrument import INSTRUMENT
+from money import format_cents
+from plan import load_plan
+from products import load_cache, save_cache
+from sys import argv
+
+BUCKET_BREAKDOWN_EXTRA_COLS = ['Out of Dept', 'Service Plans']
 BUCKET_BREAKDOWN_ROWS = ('Commission', 'Sales', '% Total Sales')
+LINE_ITEM_COLS = ('Transaction', 'Type', 'Line', 'Sku', 'Description', 'Qty', 'Unit Price', 'Total', 'Category', 'Bracket', 'Commission')
+LINE_ITEM_COLWIDTHS = (150, 70, 40, 70, 300, 40, 90, 90, 90, 110, 90)
+PREVIEW_LINES = 200 # Lines of the clipboard shown in the text box when processing it directly
+POLL_MS = 16 # How often the main loop checks on a running job, about once a frame at 60 fps
 
 
-class PersonalStats:
-	def __init__(self):
-		self.bucket_totals = [0] * len(COMMISSION_RATES)
-		self.service_plan_total = 0
-		self.out_of_dept_total = 0
-		self.seen_custs = set()
-		self.deductions = [0] * len(COMMISSION_RATES)
-		self.prev_table = None
-
-		self.returns_count = 0
-		self.returns_totals = [0] * len(COMMISSION_RATES)
-	
-	def clear(self):
-		self.__init__()
-
-	# ----------------------------------------- Commission calculations
-	def calc_bucket_commissions(self):
-		bucket_totals = [total - deduction for total, deduction in zip(self.bucket_totals, self.deductions)]
-		return [total*rate for total, rate in zip(bucket_totals, COMMISSION_RATES)]
-
-	def calc_out_of_dept_commission(self):
-		return self.out_of_dept_total * OUT_OF_DEPT_RATE
+def read_deductions(deductions_ents):
+	# TODO: handle malformed input
+	return [ent.get() for ent in deductions_ents]
 
-	def calc_service_plan_commission(self):
-		return self.service_plan_total*SERVICE_PLAN_RATE
+def update_results(window, text_in, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls, text=None):
+	'''Starts processing text, or else the pasted text, on a worker thread. Results are shown by poll_job when it finishes'''
+	if session['job'] is not None: return
 
-	def calc_returns_stats(self):
-		return sum([total*rate for total, rate in zip(self.returns_totals, COMMISSION_RATES)]), sum(self.returns_totals)
-
-	def calculate_commission(self):
-		commission = sum(self.calc_bucket_commissions()) \
-				+ self.calc_out_of_dept_commission() \
-				+ self.calc_service_plan_commission()
-		sales_total = sum(self.bucket_totals) + self.service_plan_total
-
-		return commission, sales_total
-
-def get_commission_bucket(unit_price):
-	if unit_price < 0: raise ValueError('UNIT PRICE MUST BE NON-NEGATIVE')
-
-	for i in range(1, len(COMMISSION_RANGES)):
-		if unit_price < COMMISSION_RANGES[i][0]: return i-1
-
-	return len(COMMISSION_RANGES)-1
+	try:
+		if text is None:
+			with INSTRUMENT.stage('read_text'):
+				text = text_in.get('1.0', 'end-1c')
 
-def parse_table(text_in):
-	contents = [line.strip().lower() for line in text_in.get('1.0', 'end-1c').split('\n')]
+		session['job'] = Job(text, read_deductions(deductions_ents), session['stats']).start()
+		controls['process']['state'] = 'disabled'
+		controls['process_clipboard']['state'] = 'disabled'
+		controls['cancel']['state'] = 'normal'
+		controls['progress']['text'] = 'Processing...'
 
-	# Find start of table
-	for i in range(len(contents)):
-		if contents[i] == 'total' and contents[i+1][:8] == 'total: $': break
-	
-	i += 2
-
-	# Parse table, filter out junk
-	# TODO: make more thorough
-	table = [line.split('\t') for line in contents[i:]]
-	table = [line for line in table if len(line) == 8]
-	return table
-
-def is_service_plan(description):
-	split = description.split()
-
-	return split[0].isdigit() and split[1] == 'year' and split[-1] == 'plan'
-
-def calc_commission(table, deductions_ents, stats):
-	if table != stats.prev_table:
-		# Calculate commissions, 3 buckets
-		# item = [Transaction Number, Sale Type, Line, Sku, Description, Qty, Unit Price, Total]
-		for item in table:
-			# Format differs for sale and exchange transactions
-			if item[1] == 'sale':
-				unit_price, total = float(item[-2][1:].replace(',', '')), float(item[-1][1:].replace(',', ''))
-
-				# Service plans have different rates
-				if is_service_plan(item[4]):
-					stats.service_plan_total += total
-				else:
-					bucket_index = get_commission_bucket(unit_price)
-					stats.bucket_totals[bucket_index] += total # TODO: does (total == qty*unit_price)?
-			elif item[1] == 'exchange':
-				total = float(item[-1][2:-1].replace(',', '')) # TODO: verify total is ok, qty doesn't matter
-				bucket_index = get_commission_bucket(total)
-				stats.bucket_totals[bucket_index] += total
-			elif item[1] == 'return':
-				total = float(item[-1][2:-1].replace(',', '')) # TODO: verify total is ok, qty doesn't matter
-				bucket_index = get_commission_bucket(total)
-				stats.returns_count += 1 # TODO: add 1 or actual count of returned
-				stats.returns_totals[bucket_index] += total
-
-		stats.prev_table = table
-	
-	# Handle specified deductions
-	stats.out_of_dept_total = 0
-
-	for i in range(len(stats.bucket_totals)):
-		# TODO: what about negatives?
-		# TODO: handle malformed input
-		ent = deductions_ents[i].get()
-		if ent:
-			ent = float(ent.replace(',', ''))
-			stats.deductions[i] = ent
-			stats.out_of_dept_total += ent
-	
-	# Multiplies corresponding rates and bucket_totals
-	total_commission, sales_total = stats.calculate_commission()
+		poll_job(window, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls, session['job'])
+	except Exception as e:
+		print_exception(e)
 
-	return total_commission, sales_total
+def process_clipboard(window, text_in, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls):
+	'''Processes the clipboard as is, without laying it all out in the text box first
 
-def count_customers(table, stats):
-	for transaction in table:
-		stats.seen_custs.add(transaction[0])
-	
-	return len(stats.seen_custs)
+	Only the first PREVIEW_LINES lines are put in the text box, since Tk's text
+	layout is far slower than parsing for large pastes.
+	'''
+	if session['job'] is not None: return
 
-def update_results(text_in, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, stats):
 	try:
-		table = parse_table(text_in)
-		commission, sales_total = calc_commission(table, deductions_ents, stats)
-		n_custs = count_customers(table, stats)
-		returns_commission_lost, returns_total = stats.calc_returns_stats()
-
-		results_lbls['commission_lbl']['text'] = 'Total Commission: $' + str(round(commission, 2))
-		results_lbls['cust_lbl']['text'] = 'Customers Helped: ' + str(n_custs)
-		results_lbls['sales_lbl']['text'] = 'Total Sales: $' + str(round(sales_total, 2))
-		results_lbls['overall_rate_lbl']['text'] = 'Commission Rate: ' + (str(round(commission / sales_total * 100, 2)) if sales_total else '0') + '%' # Handles divide by 0 error
-
-		returns_lbls['count']['text'] = f'Returns Count: {stats.returns_count}'
-		returns_lbls['total']['text'] = f'Returns Total: ${returns_total}'
-		returns_lbls['commission']['text']  = f'Returns Commission Lost: ${round(returns_commission_lost, 2)}'
-
-		# Update breakdown table
-		# Commission row
-		bucket_commissions = stats.calc_bucket_commissions()
-		for i in range(3): bucket_breakdown_tbl.set('row', (1,i+1), f'${round(bucket_commissions[i], 2)}')
-		bucket_breakdown_tbl.set('row', (1,4), f'${round(stats.calc_out_of_dept_commission(), 2)}')
-		bucket_breakdown_tbl.set('row', (1,5), f'${round(stats.calc_service_plan_commission(), 2)}')
-
-		# Sales row
-		for i in range(3): bucket_breakdown_tbl.set('row', (2,i+1), f'${round(stats.bucket_totals[i], 2)}')
-		bucket_breakdown_tbl.set('row', (2,4), f'${round(stats.out_of_dept_total, 2)}')
-		bucket_breakdown_tbl.set('row', (2,5), f'${round(stats.service_plan_total, 2)}')
-
-		# % total sales row
-		for i in range(3): bucket_breakdown_tbl.set('row', (3,i+1), f'{(round(stats.bucket_totals[i] / sales_total * 100, 2) if sales_total else 0)}%')
-		bucket_breakdown_tbl.set('row', (3,4), f'{(round(stats.out_of_dept_total / sales_total * 100, 2) if sales_total else 0)}%')
-		bucket_breakdown_tbl.set('row', (3,5), f'{(round(stats.service_plan_total / sales_total * 100, 2) if sales_total else 0)}%')
-	except Exception as e:
-		print_exception(e)
+		clipboard = window.clipboard_get()
+	except:
+		clipboard = ''
 
-def clear(transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, stats):
+	show_preview(text_in, clipboard)
+	update_results(window, text_in, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls, clipboard)
+
+def show_preview(text_in, text):
+	text_in.delete('1.0', 'end')
+
+	end = -1
+	for _ in range(PREVIEW_LINES):
+		end = text.find('\n', end + 1)
+		if end == -1: break
+
+	if end == -1:
+		text_in.insert('end', text)
+	else:
+		more = text.count('\n', end + 1) + 1
+		text_in.insert('end', text[:end] + f'\n... {more} more lines processed from the clipboard')
+
+def poll_job(window, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls, job):
+	'''Handles the messages from job on the main loop, rescheduling itself until the job ends or is dropped by clear'''
+	if session['job'] is not job: return
+
+	for kind, value in job.poll():
+		if kind == 'progress':
+			page, page_rows, rows = value
+			controls['progress']['text'] = f'Page {page}: {page_rows} rows ({rows} total)'
+			continue
+
+		end_job(session, controls)
+
+		if kind == 'done':
+			session['stats'], added = value
+			session['items'].extend(added)
+			controls['progress']['text'] = ''
+			with INSTRUMENT.stage('update_widgets'):
+				show_results(Results(session['stats']), results_lbls, returns_lbls, bucket_breakdown_tbl)
+		elif kind == 'cancelled':
+			controls['progress']['text'] = 'Cancelled'
+		else:
+			controls['progress']['text'] = ''
+			print_exception(value)
+
+		return
+
+	window.after(POLL_MS, lambda: poll_job(window, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls, job))
+
+def cancel_job(session):
+	if session['job'] is not None: session['job'].cancel()
+
+def end_job(session, controls):
+	session['job'] = None
+	controls['process']['state'] = 'normal'
+	controls['process_clipboard']['state'] = 'normal'
+	controls['cancel']['state'] = 'disabled'
+
+def show_results(results, results_lbls, returns_lbls, bucket_breakdown_tbl):
+	commission, sales_total = results.commission, results.sales_total
+
+	results_lbls['commission_lbl']['text'] = 'Total Commission: $' + str(round(commission, 2))
+	results_lbls['cust_lbl']['text'] = 'Customers Helped: ' + str(results.customers)
+	results_lbls['sales_lbl']['text'] = 'Total Sales: $' + str(round(sales_total, 2))
+	results_lbls['overall_rate_lbl']['text'] = 'Commission Rate: ' + str(round(results.overall_rate * 100, 2)) + '%'
+
+	returns_lbls['count']['text'] = f'Returns Count: {results.returns_count}'
+	returns_lbls['total']['text'] = f'Returns Total: ${results.returns_total}'
+	returns_lbls['commission']['text']  = f'Returns Commission Lost: ${round(results.returns_commission_lost, 2)}'
+
+	# Update breakdown table, all in one go on the next idle
+	commissions = results.bucket_commissions + [results.out_of_dept_commission, results.service_plan_commission]
+	totals = results.bucket_totals + [results.out_of_dept_total, results.service_plan_total]
+
+	changes = {}
+	for i, (col_commission, col_total) in enumerate(zip(commissions, totals)):
+		changes[1,i+1] = f'${round(col_commission, 2)}' # Commission row
+		changes[2,i+1] = f'${round(col_total, 2)}' # Sales row
+		changes[3,i+1] = f'{(round(col_total / sales_total * 100, 2) if sales_total else 0)}%' # % total sales row
+
+	bucket_breakdown_tbl.update(changes)
+
+def clear(transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls):
 	try:
+		# A running job's results would be added to the cleared stats, so it is dropped
+		cancel_job(session)
+		end_job(session, controls)
+		controls['progress']['text'] = ''
+
+
 		transactions_txt.delete('1.0', 'end')
 		for ent in deductions_ents: ent.delete(0, 'end')
 		for lbl in results_lbls.values(): lbl['text'] = ''
 		for lbl in returns_lbls.values(): lbl['text'] = ''
 
-		# TODO: clear table
-		for r in range(1, len(BUCKET_BREAKDOWN_ROWS)+1): bucket_breakdown_tbl.set(f'row', (r,1), *[''] * len(BUCKET_BREAKDOWN_COLS))
+		bucket_breakdown_tbl.clear((1,1))
 
-		stats.clear()
+		session['stats'].clear()
+		session['items'] = []
 	except Exception as e:
 		print_exception(e)
 
@@ -186,8 +162,80 @@ def paste_page(transactions_txt, window):
 		clipboard = ''
 	transactions_txt.insert('end', clipboard)
 
+def line_item_rows(items, plan, catalog=None):
+	'''Rows for the drill-down grid: the LineItem's columns followed by how it counts under plan'''
+	rows = []
+	for item in items:
+		category, bucket_index, commission = explain_row(item, plan, catalog)
+		rows.append((item.transaction, item.sale_type, item.line, item.sku, item.description, item.qty,
+				item.unit_price, item.total, category, -1 if bucket_index is None else bucket_index, commission))
+
+	return rows
+
+def show_line_items(window, session):
+	'''Drill-down with every row added so far, sorted by clicking a heading and filtered by typing'''
+	plan = session['stats'].plan
+	panel = tk.Toplevel(master=window)
+	panel.title('Line Items')
+
+	grid = VirtualGrid(panel, LINE_ITEM_COLS, LINE_ITEM_COLWIDTHS)
+	bracket_label = lambda i: plan.labels[i] if i >= 0 else ''
+	formatters = [str] * 6 + [format_cents, format_cents, str, bracket_label, lambda cents: format_cents(round(cents))]
+
+	filter_frame = tk.Frame(master=panel)
+	tk.Label(text='Filter:', master=filter_frame).pack(side=tk.LEFT)
+	filter_ent = tk.Entry(master=filter_frame, width=40)
+	filter_ent.bind('<KeyRelease>', lambda ev: grid.filter(filter_ent.get()))
+	filter_ent.pack(side=tk.LEFT)
+	count_lbl = tk.Label(master=filter_frame)
+	count_lbl.pack(side=tk.LEFT, padx=20)
+
+	def refresh():
+		grid.set_rows(line_item_rows(session['items'], plan, session['stats'].catalog), formatters)
+		count_lbl['text'] = f'{len(session["items"])} rows'
+
+	tk.Button(text='Refresh', master=filter_frame, command=refresh).pack(side=tk.LEFT)
+
+	filter_frame.pack(fill=tk.X)
+	grid.pack(fill=tk.BOTH, expand=True)
+	refresh()
+
+def show_timings(window):
+	'''Debug panel with the time spent in each stage of processing so far'''
+	panel = tk.Toplevel(master=window)
+	panel.title('Timings')
+
+	timings_txt = tk.Text(master=panel, width=62, height=12, font='TkFixedFont')
+
+	def refresh():
+		timings_txt.delete('1.0', 'end')
+		timings_txt.insert('end', INSTRUMENT.format_summary())
+
+	def clear_timings():
+		INSTRUMENT.clear()
+		refresh()
+
+	def export():
+		try:
+			from tkinter.filedialog import asksaveasfilename
+			path = asksaveasfilename(master=panel, defaultextension='.json', initialfile='timings.json')
+			if path: INSTRUMENT.export_json(path)
+		except Exception as e:
+			print_exception(e)
+
+	btn_frame = tk.Frame(master=panel)
+	tk.Button(text='Refresh', master=btn_frame, command=refresh).pack(side=tk.LEFT)
+	tk.Button(text='Clear', master=btn_frame, command=clear_timings).pack(side=tk.LEFT)
+	tk.Button(text='Export JSON', master=btn_frame, command=export).pack(side=tk.LEFT)
+
+	timings_txt.pack()
+	btn_frame.pack()
+	refresh()
+
 def print_exception(e):
-	exception_type, exception_object, exception_traceback = exc_info()
+	# Uses the exception's own traceback, so errors passed back from the worker thread are reported the same way
+	exception_type, exception_traceback = type(e), e.__traceback__
+	while exception_traceback.tb_next is not None: exception_traceback = exception_traceback.tb_next
 	filename = exception_traceback.tb_frame.f_code.co_filename
 	line_number = exception_traceback.tb_lineno
 	tk.messagebox.showerror('Error', f'{exception_type} error in {filename}:{line_number}\n\n{e}')
@@ -202,7 +250,7 @@ def paste_clipboard(event, window):
 			clipboard = window.clipboard_get()
 		except:
 			clipboard = ''
-		transactions_txt.insert('end', clipboard)
+		event.widget.insert('end', clipboard)
 
 def select_all(event):
 	event.widget.tag_add('sel', "1.0", 'end')
@@ -211,10 +259,15 @@ def select_all(event):
 
 # ----------------------------------------------------------- Main
 
-if __name__ == '__main__':
+def main(plan_name=None):
+	plan = load_plan(plan_name)
+	INSTRUMENT.enable(INSTRUMENT.trace_allocations)
+	load_cache()
+
 	window = tk.Tk()
-	window.title('GSA')
-	stats = PersonalStats()
+	window.title(plan.name)
+	catalog = load_catalog() # Out of department sales are found automatically when there is a catalog
+	session = {'stats': PersonalStats(plan, catalog), 'items': [], 'job': None} # items are the LineItems added to stats, for the drill-down
 	
 	instr = tk.Label(text='Enter the copied transaction records')
 	transactions_txt = tk.Text()
@@ -223,11 +276,13 @@ if __name__ == '__main__':
 
 	# Out of dept deductions section
 	deductions_frame = tk.Frame(master=window)
-	tk.Label(text='Enter the amount of out of department sales to deduct from each range', master=deductions_frame).pack()
-	deductions_ents = [None] * 3
-	for i in range(3):
+	deductions_instr = 'Enter the amount of out of department sales to deduct from each range'
+	if catalog is not None and plan.departments: deductions_instr += ' (on top of those found in the catalog)'
+	tk.Label(text=deductions_instr, master=deductions_frame).pack()
+	deductions_ents = [None] * len(plan.ranges)
+	for i, (low, high) in enumerate(plan.ranges):
 		curr = tk.Frame(master=deductions_frame)
-		lbl = tk.Label(text=f'${COMMISSION_RANGES[i][0]}-${COMMISSION_RANGES[i][1]}:', master=curr)
+		lbl = tk.Label(text=f'${low:g}-${high:g}:', master=curr)
 		ent = tk.Entry(master=curr)
 
 		lbl.pack(side=tk.LEFT)
@@ -262,25 +317,36 @@ if __name__ == '__main__':
 	returns_frame.pack(side=tk.LEFT, padx=20)
 
 	# Creating results table broken down by bucket
-	bucket_breakdown_tbl = Table(master=window, ncols=len(BUCKET_BREAKDOWN_COLS)+1, nrows=len(BUCKET_BREAKDOWN_ROWS)+1, colwidth=12)
+	bucket_breakdown_cols = list(plan.labels) + BUCKET_BREAKDOWN_EXTRA_COLS
+	bucket_breakdown_tbl = Table(master=window, ncols=len(bucket_breakdown_cols)+1, nrows=len(BUCKET_BREAKDOWN_ROWS)+1, colwidth=12)
 
-	bucket_breakdown_tbl.set('row', (0,1), *BUCKET_BREAKDOWN_COLS)
+	bucket_breakdown_tbl.set('row', (0,1), *bucket_breakdown_cols)
 	bucket_breakdown_tbl.set('col', (1,0), *BUCKET_BREAKDOWN_ROWS)
 
 	bucket_breakdown_tbl.set_colours('row', (0,1), 'white', 'grey')
 	bucket_breakdown_tbl.set_colours('col', (1,0), 'white', 'grey')
 
-	# Results should be saved and added together between process clicks until cleared
-	bucket_totals = [0,0,0]
-	
+	# Results are saved and added together in session['stats'] between process clicks until cleared
 	btn_frame = tk.Frame(master=window)
+	controls = {}
 	paste_page_btn = tk.Button(text='Paste New Page', master=btn_frame, command=lambda: paste_page(transactions_txt, window))
-	proc_btn = tk.Button(text='Process', master=btn_frame, command=lambda: update_results(transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, stats))
-	clear_btn = tk.Button(text='Clear', master=btn_frame, command=lambda: clear(transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, stats))
+	proc_btn = tk.Button(text='Process', master=btn_frame, command=lambda: update_results(window, transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls))
+	proc_clipboard_btn = tk.Button(text='Process Clipboard', master=btn_frame, command=lambda: process_clipboard(window, transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls))
+	cancel_btn = tk.Button(text='Cancel', master=btn_frame, state='disabled', command=lambda: cancel_job(session))
+	clear_btn = tk.Button(text='Clear', master=btn_frame, command=lambda: clear(transactions_txt, deductions_ents, results_lbls, returns_lbls, bucket_breakdown_tbl, session, controls))
+	line_items_btn = tk.Button(text='Line Items', master=btn_frame, command=lambda: show_line_items(window, session))
+	timings_btn = tk.Button(text='Timings', master=btn_frame, command=lambda: show_timings(window))
 
 	paste_page_btn.pack(side=tk.LEFT)
 	proc_btn.pack(side=tk.LEFT)
+	proc_clipboard_btn.pack(side=tk.LEFT)
+	cancel_btn.pack(side=tk.LEFT)
 	clear_btn.pack(side=tk.LEFT)
+	line_items_btn.pack(side=tk.LEFT)
+	timings_btn.pack(side=tk.LEFT)
+
+	progress_lbl = tk.Label(master=window)
+	controls.update(process=proc_btn, process_clipboard=proc_clipboard_btn, cancel=cancel_btn, progress=progress_lbl)
 
 	# Pack all widgets
 	instr.pack()
@@ -289,9 +355,15 @@ if __name__ == '__main__':
 	deductions_frame.pack()
 
 	btn_frame.pack()
+	progress_lbl.pack()
 	result_lbls_frame.pack()
 	bucket_breakdown_tbl.pack()
 
 	# Start running app
 	window.mainloop()
 
+	save_cache()
+
+
+if __name__ == '__main__':
+	main(argv[1] if len(argv) > 1 else None)
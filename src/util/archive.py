@@ -0,0 +1,126 @@
+'''Memory-mapped ingest of large archived Sales Lookup exports
+
+Usage: python archive.py [-o OUTPUT] [-j WORKERS] [-p PLAN]... PATH
+
+An archive is many saved pages one after another in a single file, which can
+run to several GB. The file is memory mapped and page boundaries are found by
+searching the bytes for the 'Sales Lookup - ' header and the 'Total: ' line
+that starts the table, so nothing is decoded until a page is parsed, and then
+only that page's slice of the mapping. Pages are identified by their (start,
+end) byte offsets, so they can be handed to worker processes that map the file
+for themselves.
+'''
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import mmap
+import os
+import sys
+
+import engine
+from batch import RESULT_FIELDS, aggregate
+from sales_lookup import iter_pages
+
+PAGE_MARKER = b'Sales Lookup - '
+TABLE_MARKER = b'Total: ' # Followed by $ or ($ for a negative day
+FIELDS = ('file', 'offset', 'date', 'sales_person', 'plan') + RESULT_FIELDS
+
+
+def map_file(path):
+	'''Read only mapping of the whole file, or None when it is empty'''
+	with open(path, 'rb') as f:
+		if os.fstat(f.fileno()).st_size == 0: return None
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def find_offsets(mm):
+	'''(start, end) byte offsets of every page in the mapping that has a table
+
+	A page runs from the start of its 'Sales Lookup - ' line to the start of the
+	next one. Anything before the first header belongs to the first page.
+	'''
+	starts = [0]
+	pos = mm.find(PAGE_MARKER)
+	while pos != -1:
+		line_start = mm.rfind(b'\n', 0, pos) + 1
+		if line_start > starts[-1]: starts.append(line_start)
+		pos = mm.find(PAGE_MARKER, pos + len(PAGE_MARKER))
+
+	offsets = zip(starts, starts[1:] + [len(mm)])
+	return [(start, end) for start, end in offsets if mm.find(TABLE_MARKER, start, end) != -1]
+
+def page_offsets(path):
+	'''(start, end) byte offsets of every page in the file at path'''
+	mm = map_file(path)
+	if mm is None: return []
+
+	with mm: return find_offsets(mm)
+
+def page_lines(mm, start, end):
+	'''Lines of the page at mm[start:end], decoding only that slice'''
+	return mm[start:end].decode('utf-8', errors='replace').splitlines()
+
+def iter_archive_pages(path, offsets=None):
+	'''Yields (start offset, Page) for the pages of the file at path, or just those at offsets'''
+	mm = map_file(path)
+	if mm is None: return
+
+	with mm:
+		for start, end in find_offsets(mm) if offsets is None else offsets:
+			for page in iter_pages(page_lines(mm, start, end)): yield start, page
+
+def process_pages(path, offsets=None, plans=(None,)):
+	'''Worker: returns a result row per page and plan for the pages of path at offsets (default: all)'''
+	rows = []
+
+	for start, page in iter_archive_pages(path, offsets):
+		for plan in plans:
+			stats = engine.PersonalStats(plan)
+			engine.calc_commission(page.items, (), stats)
+			engine.count_customers(page.items, stats)
+			results = engine.Results(stats)
+
+			row = {'file': path, 'offset': start, 'date': page.header.date, 'sales_person': page.header.sales_person, 'plan': stats.plan.name}
+			row.update((field, getattr(results, field)) for field in RESULT_FIELDS)
+			rows.append(row)
+
+	return rows
+
+def split_offsets(offsets, n_chunks):
+	'''Splits offsets into up to n_chunks runs of neighbouring pages, so each worker reads one region of the file'''
+	size = max(1, -(-len(offsets) // n_chunks))
+	return [offsets[i:i+size] for i in range(0, len(offsets), size)]
+
+def run(path, workers=None, plans=(None,)):
+	'''Processes every page of the archive at path across a process pool, in file order'''
+	offsets = page_offsets(path)
+	if not offsets: return []
+	if workers == 1: return process_pages(path, offsets, plans)
+
+	workers = workers or os.cpu_count() or 1
+	chunks = split_offsets(offsets, workers * 4)
+
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		results = pool.map(process_pages, [path] * len(chunks), chunks, [plans] * len(chunks))
+		return [row for rows in results for row in rows]
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Calculate commission for every page of a large archived export')
+	parser.add_argument('path', help='archive file')
+	parser.add_argument('-o', '--output', help='CSV file to write to (default: stdout)')
+	parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per core)')
+	parser.add_argument('-p', '--plan', action='append', dest='plans', help='commission plan name or file, may be repeated (default: gsa)')
+	args = parser.parse_args(argv)
+
+	rows = run(args.path, args.workers, args.plans or (None,))
+
+	out = open(args.output, 'w', newline='') if args.output else sys.stdout
+	try:
+		writer = csv.DictWriter(out, fieldnames=FIELDS, restval='')
+		writer.writeheader()
+		writer.writerows(rows)
+		writer.writerows(aggregate(rows))
+	finally:
+		if out is not sys.stdout: out.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,70 @@
+'''Processing off the Tk main loop
+
+A Job runs the engine over pasted text on a worker thread, into a copy of the
+running stats so a cancelled or failed run leaves them untouched. The worker
+never touches Tk: it posts messages to a queue, which the GUI drains with
+poll() from a window.after loop on the main thread.
+
+Messages are (kind, value) pairs:
+'progress' -- (page number, rows on the page, rows so far)
+'done' -- (the updated PersonalStats, list of the LineItems newly added to it)
+'cancelled' -- None
+'error' -- the exception raised
+'''
+from queue import Empty, Queue
+import threading
+
+from engine import add_rows, apply_deductions, count_customers, count_rows, new_rows
+from instrument import INSTRUMENT
+from sales_lookup import iter_pages
+
+
+class Job:
+	def __init__(self, text, deductions, stats):
+		self.messages = Queue()
+		self._cancel = threading.Event()
+		self.thread = threading.Thread(target=self._run, args=(text, deductions, stats.copy()), daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def cancel(self):
+		self._cancel.set()
+
+	@property
+	def running(self):
+		return self.thread.is_alive()
+
+	def poll(self):
+		'''Yields the messages posted so far without waiting for more'''
+		while True:
+			try:
+				yield self.messages.get_nowait()
+			except Empty:
+				return
+
+	def _run(self, text, deductions, stats):
+		try:
+			rows = 0
+			added = []
+			pages = INSTRUMENT.iterate('parse', iter_pages(text.splitlines()), count_rows)
+			for number, page in enumerate(pages, 1):
+				if self._cancel.is_set():
+					self.messages.put(('cancelled', None))
+					return
+
+				with INSTRUMENT.stage('calc_commission', len(page.items)):
+					page_added = list(new_rows(page.items, stats))
+					add_rows(page_added, stats)
+					added.extend(page_added)
+				with INSTRUMENT.stage('count_customers', len(page.items)):
+					count_customers(page.items, stats)
+
+				rows += len(page.items)
+				self.messages.put(('progress', (number, len(page.items), rows)))
+
+			apply_deductions(deductions, stats)
+			self.messages.put(('done', (stats, added)))
+		except Exception as e:
+			self.messages.put(('error', e))
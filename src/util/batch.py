@@ -0,0 +1,231 @@
+'''Batch processing of saved Sales Lookup pages
+
+Usage: python batch.py [-o OUTPUT] [-f {csv,json}] [-j WORKERS] [-p PLAN]... [--merge]
+                       [--catalog FILE] [--timings FILE] [--profile FILE] PATH [PATH ...]
+
+Each PATH may be a saved page (the copied text, or the page saved as HTML), a
+directory of them or a glob. Every page is run through the engine in a process
+pool and the results are written out together, one row per page and plan.
+--merge instead writes one row per plan for all the pages together, merging each
+worker's PersonalStats, so customers and exchanges spanning pages count once.
+--timings writes per-stage timings from every worker
+as JSON, --profile runs in this process under cProfile and writes a pstats dump.
+'''
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+import engine
+from instrument import INSTRUMENT
+from catalog import load_catalog
+from products import load_cache, save_cache
+from sales_lookup import HTML_SUFFIXES
+
+RESULT_FIELDS = ('commission', 'sales_total', 'customers', 'returns_count', 'returns_total', 'returns_commission_lost', 'out_of_dept_total', 'net_total')
+PAGE_SUFFIXES = ('.txt',) + HTML_SUFFIXES
+SUMMED_FIELDS = tuple(field for field in RESULT_FIELDS if field != 'customers') # A customer on several pages would be counted once per page
+
+
+def find_pages(paths):
+	'''Expands directories and globs into a sorted list of page files'''
+	pages = set()
+
+	for path in paths:
+		matches = glob.glob(path) if glob.has_magic(path) else [path]
+		for match in matches:
+			if os.path.isdir(match):
+				for entry in os.scandir(match):
+					if entry.is_file() and entry.name.lower().endswith(PAGE_SUFFIXES): pages.add(entry.path)
+			elif os.path.isfile(match):
+				pages.add(match)
+
+	return sorted(pages)
+
+def process_page(path, plans=(None,), catalog_path=None):
+	'''Worker: returns a flat result row per plan for a single page file'''
+	catalog = load_catalog(catalog_path) if catalog_path else None
+
+	with open(path, encoding='utf-8', errors='replace') as f:
+		results = engine.process_pages_plans(engine.iter_file_pages(path, f), plans, catalog=catalog)
+
+	rows = []
+	for plan_name, plan_results in results.items():
+		row = {'file': path, 'plan': plan_name}
+		row.update((field, getattr(plan_results, field)) for field in RESULT_FIELDS)
+		rows.append(row)
+
+	return rows
+
+def timed_process_page(path, plans=(None,), catalog_path=None):
+	'''Worker: process_page with instrumentation on, returns (rows, timing records)'''
+	INSTRUMENT.enable(INSTRUMENT.trace_allocations)
+	with INSTRUMENT.stage('page'):
+		rows = process_page(path, plans, catalog_path)
+
+	return rows, INSTRUMENT.drain()
+
+def run(pages, workers=None, plans=(None,), timings=False, catalog_path=None):
+	'''Processes pages across a process pool, preserving input order
+
+	With timings, the workers' timing records are gathered into INSTRUMENT.
+	'''
+	if not pages: return []
+	worker = timed_process_page if timings else process_page
+
+	if workers == 1:
+		results = [worker(page, plans, catalog_path) for page in pages]
+	else:
+		workers = workers or os.cpu_count() or 1
+		chunksize = max(1, len(pages) // (workers * 4))
+
+		with ProcessPoolExecutor(max_workers=workers, initializer=load_cache) as pool:
+			results = list(pool.map(worker, pages, [plans] * len(pages), [catalog_path] * len(pages), chunksize=chunksize))
+
+	if not timings: return [row for rows in results for row in rows]
+
+	rows = []
+	for page_rows, records in results:
+		rows.extend(page_rows)
+		INSTRUMENT.records.extend(records)
+
+	return rows
+
+def iter_paths_pages(paths):
+	'''The pages of every file at paths, with one file open at a time'''
+	for path in paths:
+		with open(path, encoding='utf-8', errors='replace') as f: yield from engine.iter_file_pages(path, f)
+
+def page_key(path):
+	'''(date, store, sales person) of the first page in the file at path, None if it has no rows'''
+	with open(path, encoding='utf-8', errors='replace') as f:
+		header = engine.first_header(path, f)
+
+	return header and (header.date, header.store, header.sales_person)
+
+def split_pages(pages, n_parts):
+	'''Splits pages into at most n_parts chunks for the workers, in order
+
+	Files whose first page has the same header, e.g. a page saved twice, go in
+	the same chunk, so the worker adds their rows once and the chunks' stats
+	hold different rows and can be merged. Only the headers are read here.
+	'''
+	groups = {}
+	for path in pages: groups.setdefault(page_key(path), []).append(path)
+
+	size = -(-len(pages) // n_parts)
+	parts, part = [], []
+	for group in groups.values():
+		part.extend(group)
+		if len(part) >= size:
+			parts.append(part)
+			part = []
+
+	if part: parts.append(part)
+	return parts
+
+def chunk_stats(paths, plans=(None,), catalog_path=None):
+	'''Worker: one PersonalStats per plan for all the pages at paths, rows in more than one file added once'''
+	catalog = load_catalog(catalog_path) if catalog_path else None
+	return engine.stats_pages_plans(iter_paths_pages(paths), plans, catalog=catalog)
+
+def run_merged(pages, workers=None, plans=(None,), catalog_path=None):
+	'''Works out PersonalStats per plan over all of pages, in chunks across a process pool merged tree style
+
+	Outputs:
+	Dict of plan name to the merged PersonalStats
+	'''
+	if not pages: return {}
+
+	if workers == 1:
+		chunks = [chunk_stats(pages, plans, catalog_path)]
+	else:
+		workers = workers or os.cpu_count() or 1
+		parts = split_pages(pages, workers * 4)
+
+		with ProcessPoolExecutor(max_workers=workers, initializer=load_cache) as pool:
+			chunks = list(pool.map(chunk_stats, parts, [plans] * len(parts), [catalog_path] * len(parts)))
+
+	merged = [engine.merge_stats([chunk[p] for chunk in chunks]) for p in range(len(chunks[0]))]
+	return {stats.plan.name: stats for stats in merged}
+
+def merged_rows(all_stats):
+	'''A TOTAL result row per plan from run_merged'''
+	rows = []
+	for plan_name, stats in all_stats.items():
+		results = engine.Results(stats)
+		row = {'file': 'TOTAL', 'plan': plan_name}
+		row.update((field, getattr(results, field)) for field in RESULT_FIELDS)
+		rows.append(row)
+
+	return rows
+
+def aggregate(rows):
+	'''Totals rows per plan, without customers, which only --merge counts'''
+	totals = {}
+	for row in rows:
+		total = totals.setdefault(row['plan'], dict.fromkeys(SUMMED_FIELDS, 0))
+		for field in SUMMED_FIELDS: total[field] += row[field]
+
+	return [dict(file='TOTAL', plan=plan_name, **total) for plan_name, total in totals.items()]
+
+def write_csv(rows, out, totals=None):
+	writer = csv.DictWriter(out, fieldnames=('file', 'plan') + RESULT_FIELDS)
+	writer.writeheader()
+	writer.writerows(rows)
+	writer.writerows(aggregate(rows) if totals is None else totals)
+
+def write_json(rows, out, totals=None):
+	json.dump({'pages': rows, 'totals': aggregate(rows) if totals is None else totals}, out, indent=2)
+	out.write('\n')
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Calculate commission for many saved Sales Lookup pages at once')
+	parser.add_argument('paths', nargs='+', help='page files, directories or globs')
+	parser.add_argument('-o', '--output', help='file to write to (default: stdout)')
+	parser.add_argument('-f', '--format', choices=('csv', 'json'), help='output format (default: from output extension, else csv)')
+	parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per core)')
+	parser.add_argument('-p', '--plan', action='append', dest='plans', help='commission plan name or file, may be repeated (default: gsa)')
+	parser.add_argument('--merge', action='store_true', help='only write totals per plan, merged over every page')
+	parser.add_argument('--catalog', metavar='FILE', help='SKU to department catalog (index or .csv) to deduct out of department sales with')
+	parser.add_argument('--timings', metavar='FILE', help='write per-stage timings as JSON')
+	parser.add_argument('--profile', metavar='FILE', help='run in this process under cProfile and write the stats')
+	args = parser.parse_args(argv)
+
+	fmt = args.format
+	if fmt is None: fmt = 'json' if args.output and args.output.lower().endswith('.json') else 'csv'
+
+	pages = find_pages(args.paths)
+	if not pages: parser.error('no pages found')
+
+	load_cache() # Workers load it too, this process saves what it learned at the end
+	totals = None
+	if args.merge:
+		try:
+			rows, totals = [], merged_rows(run_merged(pages, args.workers, args.plans or (None,), args.catalog))
+		except engine.SharedRowsError:
+			parser.error('the same rows were saved in files starting with different pages, -j 1 adds them once')
+	elif args.profile:
+		with INSTRUMENT.profile(args.profile):
+			rows = run(pages, 1, args.plans or (None,), bool(args.timings), args.catalog)
+	else:
+		rows = run(pages, args.workers, args.plans or (None,), bool(args.timings), args.catalog)
+
+	if args.timings:
+		INSTRUMENT.export_json(args.timings)
+		print(INSTRUMENT.format_summary(), file=sys.stderr)
+
+	write = write_json if fmt == 'json' else write_csv
+
+	if args.output:
+		with open(args.output, 'w', newline='' if fmt == 'csv' else None) as out: write(rows, out, totals)
+	else:
+		write(rows, sys.stdout, totals)
+
+	save_cache()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,175 @@
+'''SKU to department catalog, for working out out of department sales automatically
+
+Usage: python catalog.py SOURCE.csv INDEX
+
+A catalog is a CSV of sku,department rows. Small ones can be read straight
+into memory with Catalog.from_csv, but a store's full catalog runs to hundreds
+of thousands of SKUs, so it is compiled once into an index file: the SKUs as a
+sorted array of 64 bit integers followed by one department number per SKU.
+Each integer holds the SKU's digits and how many there were, so SKUs with
+leading zeros ('024364') stay distinct from the same number without them.
+Opening the index maps it read only and looks SKUs up by binary search in the
+mapping, so startup costs the same however big the catalog is.
+
+Index layout, little endian:
+MAGIC, count (uint32), length of the department names (uint32), the names as a
+JSON list, padding to 8 bytes, count sorted uint64 SKUs, count uint8 department
+numbers.
+'''
+from bisect import bisect_left
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+
+CATALOG_PATH = os.environ.get('COMMISSION_CATALOG') or os.path.join(os.path.expanduser('~'), '.commission_calculator', 'catalog.idx')
+MAGIC = b'SKUIDX2\0' # Version 1 indexes dropped leading zeros
+MAX_SKU_DIGITS = 15 # The digit count goes in the top 4 bits, the value in the 60 below
+HEADER = struct.Struct('<8sII')
+MAX_DEPARTMENTS = 255
+
+
+def sku_number(sku):
+	'''SKUs are stored as integers of their digit count and value, so '024364' and '24364' differ
+
+	Returns None for SKUs that aren't all digits or are too long.
+	'''
+	sku = sku.strip()
+	return len(sku) << 60 | int(sku) if sku.isdigit() and len(sku) <= MAX_SKU_DIGITS else None
+
+
+class Catalog:
+	'''Department of each SKU, held in memory or mapped from an index file'''
+
+	def __init__(self, departments, numbers=None, department_ids=None, mapping=None):
+		self.departments = departments # Department names, indexed by department number
+		self.numbers = numbers # Sorted SKU numbers, a list or a memoryview over the index
+		self.department_ids = department_ids
+		self.mapping = mapping
+		self.cache = {} # SKU string to department, the same SKUs come up again and again
+
+	def __len__(self):
+		return len(self.numbers)
+
+	def department(self, sku):
+		'''Lowercased department of sku, or None if it isn't in the catalog'''
+		try:
+			return self.cache[sku]
+		except KeyError:
+			pass
+
+		department = None
+		number = sku_number(sku)
+		if number is not None:
+			i = bisect_left(self.numbers, number)
+			if i < len(self.numbers) and self.numbers[i] == number: department = self.departments[self.department_ids[i]]
+
+		self.cache[sku] = department
+		return department
+
+	def close(self):
+		if self.mapping is not None:
+			# The memoryviews have to be released before the mapping can close
+			self.numbers.release()
+			self.department_ids.release()
+			self.mapping.close()
+			self.mapping = None
+
+	@classmethod
+	def from_pairs(cls, pairs):
+		'''Builds an in memory catalog from (sku, department) pairs, later pairs win'''
+		by_number = {}
+		for sku, department in pairs:
+			number = sku_number(sku)
+			if number is None: raise ValueError(f'SKU MUST BE NUMERIC: {sku!r}')
+			by_number[number] = department.strip().lower()
+
+		departments = sorted(set(by_number.values()))
+		if len(departments) > MAX_DEPARTMENTS: raise ValueError('TOO MANY DEPARTMENTS')
+		ids = {department: i for i, department in enumerate(departments)}
+
+		numbers = sorted(by_number)
+		return cls(departments, numbers, bytes(ids[by_number[number]] for number in numbers))
+
+	@classmethod
+	def from_csv(cls, path):
+		return cls.from_pairs(read_csv(path))
+
+	@classmethod
+	def open(cls, path):
+		'''Maps the index file at path built by write_index'''
+		with open(path, 'rb') as f:
+			mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		magic, count, names_length = HEADER.unpack_from(mapping)
+		if magic != MAGIC: raise ValueError(f'NOT A CATALOG INDEX: {path}')
+
+		offset = HEADER.size
+		departments = json.loads(bytes(mapping[offset:offset + names_length]))
+		offset = align(offset + names_length)
+
+		view = memoryview(mapping)
+		numbers = view[offset:offset + 8 * count].cast('Q') # Native order, which is little endian everywhere the calculator runs
+		department_ids = view[offset + 8 * count:offset + 9 * count]
+		view.release()
+
+		return cls(departments, numbers, department_ids, mapping)
+
+	@classmethod
+	def load(cls, path):
+		'''Opens an index file, or reads a .csv catalog into memory'''
+		return cls.from_csv(path) if path.lower().endswith('.csv') else cls.open(path)
+
+_loaded = {}
+
+def load_catalog(path=None):
+	'''Returns the catalog at path (an index or a .csv), opened once per process
+
+	Without a path it is the catalog at CATALOG_PATH, or None if there isn't one.
+	'''
+	if path is None:
+		if not os.path.isfile(CATALOG_PATH): return None
+		path = CATALOG_PATH
+
+	catalog = _loaded.get(path)
+	if catalog is None: catalog = _loaded[path] = Catalog.load(path)
+
+	return catalog
+
+def align(offset):
+	return (offset + 7) & ~7
+
+def read_csv(path):
+	'''(sku, department) pairs from a catalog CSV, skipping a header row if there is one'''
+	with open(path, newline='', encoding='utf-8') as f:
+		for row in csv.reader(f):
+			if len(row) < 2 or sku_number(row[0]) is None: continue
+			yield row[0], row[1]
+
+def write_index(catalog, path):
+	'''Writes an in memory catalog out as an index file that Catalog.open can map'''
+	names = json.dumps(catalog.departments).encode()
+	count = len(catalog.numbers)
+
+	with open(path, 'wb') as f:
+		f.write(HEADER.pack(MAGIC, count, len(names)))
+		f.write(names)
+		f.write(b'\0' * (align(HEADER.size + len(names)) - HEADER.size - len(names)))
+		f.write(struct.pack(f'<{count}Q', *catalog.numbers))
+		f.write(bytes(catalog.department_ids))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Compile a sku,department CSV into a catalog index')
+	parser.add_argument('source', help='CSV of sku,department rows')
+	parser.add_argument('index', help='index file to write')
+	args = parser.parse_args(argv)
+
+	catalog = Catalog.from_csv(args.source)
+	write_index(catalog, args.index)
+	print(f'{len(catalog)} SKUs in {len(catalog.departments)} departments', file=sys.stderr)
+
+if __name__ == '__main__':
+	main()
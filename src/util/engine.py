@@ -0,0 +1,485 @@
+'''Headless commission engine
+
+Turns the text of a Sales Lookup page into commission results without touching
+tkinter, so it can be imported by batch jobs and servers as well as the GUI.
+'''
+from instrument import INSTRUMENT
+from money import parse_cents, to_cents, to_dollars
+from plan import load_plan
+from products import PRODUCTS, SERVICE_PLAN, classify_description
+from sales_lookup import is_html, iter_line_items, iter_pages
+
+OUT_OF_DEPT = 'out of dept'
+
+
+class SharedRowsError(ValueError):
+	'''Raised by PersonalStats.merge when both sides already hold some of the same rows'''
+
+
+class PersonalStats:
+	'''Running totals for one associate under one commission plan
+
+	All amounts are integer cents, so sums stay exact over any number of rows.
+	Commissions come out as fractional cents and are turned into dollars by Results.
+	'''
+
+	def __init__(self, plan=None, catalog=None):
+		self.plan = load_plan(plan)
+		self.catalog = catalog # catalog.Catalog to find out of department rows with, if any
+		n_brackets = len(self.plan.rates)
+
+		self.bucket_totals = [0] * n_brackets
+		self.service_plan_total = 0
+		self.out_of_dept_total = 0
+		self.seen_custs = set()
+		self.typed_deductions = [0] * n_brackets # Out of department sales typed in by hand
+		self.deductions = [0] * n_brackets # Typed plus found, what comes off each bracket
+		self.out_of_dept_totals = [0] * n_brackets # Sales the catalog puts outside the plan's departments
+		self.seen_rows = set() # LineItem.key of every row already added
+		self.net_total = 0 # Signed sum of every row, matches the page's 'Total: $'
+
+		self.returns_count = 0 # Units returned, from the Qty of each return row
+		self.returns_totals = [0] * n_brackets
+		self.leg_nets = {} # (sale type, transaction, bracket, out of dept) to (signed net, units refunded) so far of rules with net_legs
+
+	def clear(self):
+		self.__init__(self.plan, self.catalog)
+
+	def copy(self):
+		'''Independent copy of the running totals, sharing the plan'''
+		stats = PersonalStats.__new__(PersonalStats)
+		stats.__dict__.update(self.__dict__)
+		for name in ('bucket_totals', 'seen_custs', 'typed_deductions', 'deductions', 'out_of_dept_totals', 'seen_rows', 'returns_totals', 'leg_nets'): setattr(stats, name, getattr(self, name).copy())
+
+		return stats
+
+	def merge(self, other):
+		'''Adds the totals of other into these, for combining stats worked out separately
+
+		Merging is associative and commutative, so pages, days, associates or
+		stores can be run in separate processes and the pieces merged in any
+		order, giving the same totals as one serial run. Both have to be for the
+		same plan and hold different rows. Netted transactions whose legs ended
+		up on both sides are netted again as a whole. Deductions typed in by hand
+		are for the whole run rather than for a piece, so they are only counted
+		once and pieces with different ones can't be merged.
+
+		Outputs:
+		self
+		'''
+		if other.plan is not self.plan and other.plan.name != self.plan.name: raise ValueError('CANNOT MERGE STATS FOR DIFFERENT PLANS')
+		if not self.seen_rows.isdisjoint(other.seen_rows): raise SharedRowsError('CANNOT MERGE STATS SHARING ROWS')
+		if any(other.typed_deductions):
+			if not any(self.typed_deductions): self.typed_deductions = other.typed_deductions.copy()
+			elif self.typed_deductions != other.typed_deductions: raise ValueError('CANNOT MERGE STATS WITH DIFFERENT TYPED DEDUCTIONS')
+
+		for name in ('bucket_totals', 'out_of_dept_totals', 'returns_totals'):
+			setattr(self, name, [mine + theirs for mine, theirs in zip(getattr(self, name), getattr(other, name))])
+
+		self.service_plan_total += other.service_plan_total
+		self.net_total += other.net_total
+		self.returns_count += other.returns_count
+		self.seen_custs |= other.seen_custs
+		self.seen_rows |= other.seen_rows
+
+		rules = self.plan.rules
+		nets = self.leg_nets
+		for key, theirs in other.leg_nets.items():
+			mine = nets.get(key)
+			if mine is None:
+				nets[key] = theirs
+				continue
+
+			# Both sides counted their own part of the transaction, count the whole net instead
+			rule = rules[key[0]]
+			count_net(self, rule, key, mine, -1)
+			count_net(self, rule, key, theirs, -1)
+			net = nets[key] = mine[0] + theirs[0], mine[1] + theirs[1]
+			count_net(self, rule, key, net)
+
+		self.update_deductions()
+		return self
+
+	def update_deductions(self):
+		'''Works out the deductions from each bracket from the typed ones and whatever the catalog found'''
+		self.deductions = [typed + found for typed, found in zip(self.typed_deductions, self.out_of_dept_totals)]
+		self.out_of_dept_total = sum(self.deductions)
+
+	def __add__(self, other):
+		return self.copy().merge(other)
+
+	def __getstate__(self):
+		# The catalog may be a memory mapped file, worker processes open their own
+		return dict(self.__dict__, catalog=None)
+
+	# ----------------------------------------- Commission calculations
+	def calc_bucket_commissions(self):
+		bucket_totals = [total - deduction for total, deduction in zip(self.bucket_totals, self.deductions)]
+		return [total*rate for total, rate in zip(bucket_totals, self.plan.rates)]
+
+	def calc_out_of_dept_commission(self):
+		return self.out_of_dept_total * self.plan.out_of_dept_rate
+
+	def calc_service_plan_commission(self):
+		return self.service_plan_total*self.plan.service_plan_rate
+
+	def calc_returns_stats(self):
+		return sum([total*rate for total, rate in zip(self.returns_totals, self.plan.rates)]), sum(self.returns_totals)
+
+	def calculate_commission(self):
+		commission = sum(self.calc_bucket_commissions()) \
+				+ self.calc_out_of_dept_commission() \
+				+ self.calc_service_plan_commission()
+		sales_total = sum(self.bucket_totals) + self.service_plan_total
+
+		return commission, sales_total
+
+
+class Results:
+	'''Snapshot of the figures shown in the results section for a PersonalStats, in dollars'''
+
+	def __init__(self, stats):
+		commission, sales_total = stats.calculate_commission()
+		returns_commission_lost, returns_total = stats.calc_returns_stats()
+
+		self.commission = to_dollars(commission)
+		self.sales_total = to_dollars(sales_total)
+		self.customers = len(stats.seen_custs)
+		self.returns_commission_lost = to_dollars(returns_commission_lost)
+		self.returns_total = to_dollars(returns_total)
+		self.returns_count = stats.returns_count
+		self.net_total = to_dollars(stats.net_total)
+
+		self.bucket_commissions = [to_dollars(c) for c in stats.calc_bucket_commissions()]
+		self.bucket_totals = [to_dollars(t) for t in stats.bucket_totals]
+		self.out_of_dept_commission = to_dollars(stats.calc_out_of_dept_commission())
+		self.out_of_dept_total = to_dollars(stats.out_of_dept_total)
+		self.service_plan_commission = to_dollars(stats.calc_service_plan_commission())
+		self.service_plan_total = to_dollars(stats.service_plan_total)
+
+	@property
+	def overall_rate(self):
+		return self.commission / self.sales_total if self.sales_total else 0
+
+	def as_dict(self):
+		return dict(vars(self), overall_rate=self.overall_rate)
+
+def merge_stats(all_stats):
+	'''Merges a list of PersonalStats pairwise, tree style, into a new one
+
+	Each level halves the list, so no single merge grows with the number of pieces
+	until the last few. The inputs are left as they were.
+	'''
+	if not all_stats: raise ValueError('NOTHING TO MERGE')
+
+	level = [stats.copy() for stats in all_stats]
+	while len(level) > 1:
+		level = [level[i].merge(level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+
+	return level[0]
+
+def get_commission_bucket(unit_price, plan=None):
+	'''Index of the bracket a unit price in dollars falls in'''
+	return load_plan(plan).bucket(to_cents(unit_price))
+
+def parse_table(text):
+	'''Extracts the transaction rows from the text of one or more Sales Lookup pages
+
+	Inputs:
+	text -- the page(s) as copied out of the browser
+
+	Outputs:
+	A list of LineItems from every page
+	'''
+	return [item for _, item in iter_line_items(text.split('\n'))]
+
+def is_service_plan(description):
+	return classify_description(description) == SERVICE_PLAN
+
+def new_rows(table, stats):
+	'''Yields the rows of table not already added to stats, recording them as added'''
+	seen_rows = stats.seen_rows
+
+	for item in table:
+		key = item.key
+		if key not in seen_rows:
+			seen_rows.add(key)
+			yield item
+
+def calc_commission(table, deductions, stats):
+	'''Adds the rows of table to stats and applies the out of department deductions
+
+	Inputs:
+	table -- rows from parse_table
+	deductions -- out of department sales to deduct from each range, in dollars
+	stats -- PersonalStats to accumulate into
+
+	Outputs:
+	(total commission, total sales) in cents
+	'''
+	# Only rows not seen before are added, so re-pasting or overlapping pages is safe
+	add_rows(new_rows(table, stats), stats)
+
+	apply_deductions(deductions, stats)
+
+	# Multiplies corresponding rates and bucket_totals
+	total_commission, sales_total = stats.calculate_commission()
+
+	return total_commission, sales_total
+
+def add_rows(rows, stats):
+	'''Adds rows to stats without checking whether they were added before'''
+	plan = stats.plan
+	rules = plan.rules
+	category_of = PRODUCTS.lookup
+	departments = plan.departments
+	catalog = stats.catalog if departments else None
+
+	for item in rows:
+		total = item.total
+		stats.net_total += total
+
+		rule = rules.get(item.sale_type)
+		if rule is None: continue
+
+		# Service plans have different rates
+		if rule.service_plans:
+			if category_of(item.sku or item.description, item.description) == SERVICE_PLAN:
+				stats.service_plan_total += total
+				continue
+
+		if rule.net_legs:
+			add_leg(item, rule, stats)
+			continue
+
+		if rule.by_total:
+			total = abs(total) # TODO: verify total is ok, qty doesn't matter
+			bucket_index = plan.bucket(total)
+		else:
+			bucket_index = plan.bucket(item.unit_price) # TODO: does (total == qty*unit_price)?
+
+		if rule.returns:
+			stats.returns_count += abs(item.qty) or 1
+			stats.returns_totals[bucket_index] += total
+		else:
+			stats.bucket_totals[bucket_index] += total
+
+			if catalog is not None:
+				department = catalog.department(item.sku)
+				if department is not None and department not in departments: stats.out_of_dept_totals[bucket_index] += total
+
+def leg_bucket(item, rule, plan):
+	'''Bracket of one leg of a netted transaction, bracketed by its size whichever way it goes'''
+	return plan.bucket(abs(item.total) if rule.by_total else abs(item.unit_price))
+
+def is_out_of_dept(item, plan, catalog):
+	'''Whether catalog puts the row's SKU in a department outside plan's'''
+	if catalog is None or not plan.departments: return False
+
+	department = catalog.department(item.sku)
+	return department is not None and department not in plan.departments
+
+def add_leg(item, rule, stats):
+	'''Adds one leg of a transaction whose rows are netted against each other, e.g. one side of an exchange
+
+	The signed totals of a transaction's legs are summed per bracket, in a dict
+	keyed by (sale type, transaction, bracket, out of dept) so each leg costs one
+	lookup. A positive net counts towards the rule's totals, and towards the out
+	of department deductions if the catalog puts its SKUs outside the plan's
+	departments. A negative one is a refund, counted as a return of the units on
+	the refunded legs, so an even swap adds nothing. Each leg takes back what its
+	transaction had put in the bracket so far and adds the new net, which keeps
+	the totals right when the legs arrive on different pages or pastes.
+	'''
+	bucket_index = leg_bucket(item, rule, stats.plan)
+	key = item.sale_type, item.transaction, bucket_index, is_out_of_dept(item, stats.plan, stats.catalog)
+
+	nets = stats.leg_nets
+	old = nets.get(key, (0, 0))
+	new = nets[key] = old[0] + item.total, old[1] + ((abs(item.qty) or 1) if item.total < 0 else 0)
+
+	count_net(stats, rule, key, old, -1)
+	count_net(stats, rule, key, new, 1)
+
+def count_net(stats, rule, key, net, sign=1):
+	'''Adds (sign 1) or takes back (sign -1) what a transaction's (net, units refunded) under key counts for'''
+	_, _, bucket_index, out_of_dept = key
+	net, units = net
+	if net > 0:
+		totals = stats.returns_totals if rule.returns else stats.bucket_totals
+		totals[bucket_index] += sign * net
+		if out_of_dept and not rule.returns: stats.out_of_dept_totals[bucket_index] += sign * net
+	elif net < 0:
+		stats.returns_totals[bucket_index] -= sign * net
+		stats.returns_count += sign * units
+
+def explain_row(item, plan=None, catalog=None):
+	'''How a single row counts under plan, worked out the same way as add_rows
+
+	Inputs:
+	item -- a LineItem
+	plan -- Plan or plan name
+	catalog -- optional catalog.Catalog to find out of department rows with
+
+	Outputs:
+	(category, bracket index or None, commission in cents). Category is the sale type,
+	'service plan' or 'out of dept', and returns give their commission lost as a
+	negative. Legs of netted transactions give their signed share, so the legs of
+	an exchange in the same bracket add up to its net. Deductions typed in by hand
+	are not taken off.
+	'''
+	plan = load_plan(plan)
+	rule = plan.rules.get(item.sale_type)
+	if rule is None: return item.sale_type, None, 0
+
+	if rule.service_plans and PRODUCTS.is_service_plan(item.sku, item.description):
+		return SERVICE_PLAN, None, item.total * plan.service_plan_rate
+
+	if rule.net_legs:
+		# Each leg's share of its transaction's net, e.g. the returned side of an exchange comes off
+		bucket_index = leg_bucket(item, rule, plan)
+		if is_out_of_dept(item, plan, catalog): return OUT_OF_DEPT, bucket_index, item.total * plan.out_of_dept_rate
+		return item.sale_type, bucket_index, item.total * plan.rates[bucket_index]
+
+	if rule.by_total:
+		total = abs(item.total)
+		bucket_index = plan.bucket(total)
+	else:
+		total = item.total
+		bucket_index = plan.bucket(item.unit_price)
+
+	if rule.returns: return item.sale_type, bucket_index, -total * plan.rates[bucket_index]
+
+	if is_out_of_dept(item, plan, catalog): return OUT_OF_DEPT, bucket_index, total * plan.out_of_dept_rate
+
+	return item.sale_type, bucket_index, total * plan.rates[bucket_index]
+
+def apply_deductions(deductions, stats):
+	'''Sets the deductions from each bracket to the amounts typed in plus whatever the catalog found'''
+	# TODO: what about negatives?
+	deductions = [to_cents(deduction) for deduction in deductions]
+	stats.typed_deductions = (deductions + [0] * len(stats.bucket_totals))[:len(stats.bucket_totals)]
+	stats.update_deductions()
+
+def count_customers(table, stats):
+	for item in table:
+		stats.seen_custs.add(item.transaction)
+
+	return len(stats.seen_custs)
+
+# ----------------------------------------------------------- Entry points
+
+def count_rows(page):
+	return len(page.items)
+
+def decode(buf):
+	'''Decodes a saved page, tolerating the odd non-UTF-8 byte browsers write out'''
+	return bytes(buf).decode('utf-8', errors='replace')
+
+def process_lines(lines, deductions=(), stats=None):
+	'''Runs every page in lines through the engine, one page at a time
+
+	Inputs:
+	lines -- iterable of lines from one or more pages as copied out of the browser
+	deductions -- out of department sales to deduct from each range, in dollars
+	stats -- PersonalStats to accumulate into, a fresh one is used if omitted
+
+	Outputs:
+	Results for everything accumulated in stats
+	'''
+	return process_pages(iter_pages(lines), deductions, stats)
+
+def process_pages(pages, deductions=(), stats=None):
+	'''Same as process_lines for pages that are already parsed, e.g. from sales_lookup_html'''
+	if stats is None: stats = PersonalStats()
+
+	for page in INSTRUMENT.iterate('parse', pages, count_rows):
+		with INSTRUMENT.stage('calc_commission', len(page.items)):
+			calc_commission(page.items, deductions, stats)
+		with INSTRUMENT.stage('count_customers', len(page.items)):
+			count_customers(page.items, stats)
+
+	apply_deductions(deductions, stats)
+
+	return Results(stats)
+
+def process_lines_plans(lines, plans, deductions=(), catalog=None):
+	'''Evaluates several commission plans over lines while only parsing them once
+
+	Inputs:
+	lines -- iterable of lines from one or more pages
+	plans -- plan names, paths or Plans, e.g. ('gsa', 'byo')
+	deductions -- out of department sales to deduct from each range, in dollars
+	catalog -- optional catalog.Catalog to find out of department sales with
+
+	Outputs:
+	Dict of plan name to Results
+	'''
+	return process_pages_plans(iter_pages(lines), plans, deductions, catalog)
+
+def process_pages_plans(pages, plans, deductions=(), catalog=None):
+	'''Same as process_lines_plans for pages that are already parsed'''
+	all_stats = stats_pages_plans(pages, plans, deductions, catalog)
+
+	return {stats.plan.name: Results(stats) for stats in all_stats}
+
+def stats_pages_plans(pages, plans, deductions=(), catalog=None):
+	'''Same as process_pages_plans, but returns the PersonalStats for each plan, e.g. to merge'''
+	all_stats = [PersonalStats(plan, catalog) for plan in plans]
+
+	for page in INSTRUMENT.iterate('parse', pages, count_rows):
+		for stats in all_stats:
+			with INSTRUMENT.stage('calc_commission', len(page.items)):
+				calc_commission(page.items, deductions, stats)
+			with INSTRUMENT.stage('count_customers', len(page.items)):
+				count_customers(page.items, stats)
+
+	for stats in all_stats: apply_deductions(deductions, stats)
+
+	return all_stats
+
+def process_text(text, deductions=(), stats=None):
+	return process_lines(text.split('\n'), deductions, stats)
+
+def process_file(path, deductions=(), stats=None):
+	'''Runs a saved page through the engine, either the copied text or the page saved as HTML'''
+	with open(path, encoding='utf-8', errors='replace') as f:
+		return process_pages(iter_file_pages(path, f), deductions, stats)
+
+def iter_file_pages(path, f):
+	'''Pages of the open file f, parsed as HTML when path says it is'''
+	if not is_html(path): return iter_pages(f)
+
+	from sales_lookup_html import iter_html_pages, read_chunks # html.parser is only imported when there is HTML to read
+	return iter_html_pages(read_chunks(f))
+
+def first_header(path, f):
+	'''PageHeader of the first page in the open file f with any rows, reading only as far as its first row'''
+	if not is_html(path):
+		pairs = iter_line_items(f)
+	else:
+		from sales_lookup_html import iter_html_line_items, read_chunks
+		pairs = iter_html_line_items(read_chunks(f))
+
+	for header, _ in pairs: return header
+
+def process_bytes(buf, deductions=(), stats=None):
+	return process_text(decode(buf), deductions, stats)
+
+def reconcile(lines):
+	'''Checks that the rows of each day add up to the 'Total: $' printed on its pages
+
+	Inputs:
+	lines -- iterable of lines from one or more pages
+
+	Outputs:
+	List of (PageHeader, page total, sum of rows) in cents for every day that doesn't add up
+	'''
+	days = {}
+	for page in iter_pages(lines):
+		header = page.header
+		day = days.setdefault((header.date, header.store, header.sales_person, header.total), [header, 0])
+		day[1] += sum(item.total for item in page.items)
+
+	return [(header, parse_cents(header.total), actual) for header, actual in days.values()
+			if header.total is not None and parse_cents(header.total) != actual]
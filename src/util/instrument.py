@@ -0,0 +1,157 @@
+'''Per-stage timing instrumentation
+
+Stages of processing are wrapped with INSTRUMENT.stage('name', rows), which
+records wall time, row counts and optionally allocations. While disabled,
+stage() hands back one shared do-nothing context manager, so it is cheap enough
+to leave in place everywhere.
+
+Set COMMISSION_TIMINGS=1 in the environment to enable it at import, or
+COMMISSION_TIMINGS=alloc to trace allocations as well.
+'''
+import os
+import time
+
+# tracemalloc, json and cProfile are only imported when they're used, so importing the engine stays quick
+
+
+class _NullStage:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+	def add_rows(self, rows):
+		pass
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+	def __init__(self, instrument, name, rows):
+		self.instrument = instrument
+		self.name = name
+		self.rows = rows
+
+	def __enter__(self):
+		if self.instrument.trace_allocations:
+			import tracemalloc
+			self.memory_start = tracemalloc.get_traced_memory()[0]
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		seconds = time.perf_counter() - self.start
+		allocated = None
+		if self.instrument.trace_allocations:
+			import tracemalloc
+			allocated = tracemalloc.get_traced_memory()[0] - self.memory_start
+		self.instrument.record(self.name, seconds, self.rows, allocated)
+		return False
+
+	def add_rows(self, rows):
+		self.rows = (self.rows or 0) + rows
+
+
+class Instrument:
+	def __init__(self):
+		self.enabled = False
+		self.trace_allocations = False
+		self.records = []
+
+	def enable(self, trace_allocations=False):
+		self.enabled = True
+		self.trace_allocations = trace_allocations
+		if trace_allocations:
+			import tracemalloc
+			if not tracemalloc.is_tracing(): tracemalloc.start()
+
+	def disable(self):
+		self.enabled = self.trace_allocations = False
+
+	def stage(self, name, rows=None):
+		'''Context manager timing one run of a stage, rows can also be added inside it with add_rows'''
+		if not self.enabled: return _NULL_STAGE
+		return _Stage(self, name, rows)
+
+	def iterate(self, name, iterable, count_rows=None):
+		'''Yields from iterable, timing the work of producing each item as the stage name
+
+		count_rows -- optional function giving the number of rows in an item
+		'''
+		if not self.enabled:
+			yield from iterable
+			return
+
+		iterator = iter(iterable)
+		while True:
+			with self.stage(name) as stage:
+				try:
+					item = next(iterator)
+				except StopIteration:
+					return
+				stage.add_rows(count_rows(item) if count_rows else 1)
+			yield item
+
+	def record(self, name, seconds, rows=None, allocated=None):
+		self.records.append({'stage': name, 'seconds': seconds, 'rows': rows, 'allocated_bytes': allocated})
+
+	def clear(self):
+		self.records = []
+
+	def drain(self):
+		'''Returns and clears the records, e.g. to send them back from a worker process'''
+		records, self.records = self.records, []
+		return records
+
+	def summary(self):
+		'''Totals per stage, in the order stages first ran'''
+		stages = {}
+		for record in self.records:
+			stage = stages.setdefault(record['stage'], {'stage': record['stage'], 'calls': 0, 'seconds': 0, 'rows': 0, 'allocated_bytes': None})
+			stage['calls'] += 1
+			stage['seconds'] += record['seconds']
+			stage['rows'] += record['rows'] or 0
+			if record['allocated_bytes'] is not None: stage['allocated_bytes'] = (stage['allocated_bytes'] or 0) + record['allocated_bytes']
+
+		return list(stages.values())
+
+	def format_summary(self):
+		lines = [f'{"stage":<20} {"calls":>7} {"seconds":>10} {"rows":>10} {"alloc KiB":>10}']
+		for stage in self.summary():
+			allocated = f'{stage["allocated_bytes"] / 1024:.0f}' if stage['allocated_bytes'] is not None else '-'
+			lines.append(f'{stage["stage"]:<20} {stage["calls"]:>7} {stage["seconds"]:>10.4f} {stage["rows"]:>10} {allocated:>10}')
+
+		return '\n'.join(lines)
+
+	def export_json(self, path):
+		import json
+
+		with open(path, 'w') as f:
+			json.dump({'summary': self.summary(), 'records': self.records}, f, indent=2)
+
+	def profile(self, path):
+		'''Context manager running the block under cProfile and writing a pstats dump to path'''
+		return _Profile(path)
+
+
+class _Profile:
+	def __init__(self, path):
+		self.path = path
+
+	def __enter__(self):
+		import cProfile
+
+		self.profiler = cProfile.Profile()
+		self.profiler.enable()
+		return self.profiler
+
+	def __exit__(self, *exc):
+		self.profiler.disable()
+		self.profiler.dump_stats(self.path)
+		return False
+
+INSTRUMENT = Instrument()
+
+_env = os.environ.get('COMMISSION_TIMINGS', '').lower()
+if _env: INSTRUMENT.enable(trace_allocations=_env == 'alloc')
@@ -0,0 +1,57 @@
+'''Conversions between the page's money strings and integer cents
+
+Amounts are kept in whole cents while aggregating so totals stay exact no
+matter how many rows are summed, and only turned back into dollars for display.
+'''
+
+CACHE_SIZE = 1 << 16
+
+_cents_cache = {} # Prices repeat constantly, so most lookups never reach the parsing below
+
+
+def parse_cents(text):
+	'''Converts a money string to integer cents
+
+	Inputs:
+	text -- '$1,234.56', '($1,234.56)' or '-$1,234.56' style amount, the $ and commas are optional
+
+	Outputs:
+	The amount in cents, negative for parenthesised or minus-signed amounts
+	'''
+	cents = _cents_cache.get(text)
+	if cents is None:
+		cents = _parse_cents(text)
+		if len(_cents_cache) < CACHE_SIZE: _cents_cache[text] = cents
+
+	return cents
+
+def _parse_cents(text):
+	# Fast paths for the two formats used on the page, always with two decimals
+	if text[-3:-2] == '.' and text[:1] == '$':
+		return int(text[1:].replace(',', '').replace('.', ''))
+	if text[-4:-3] == '.' and text[:2] == '($':
+		return -int(text[2:-1].replace(',', '').replace('.', ''))
+
+	neg = text[:1] == '('
+	if neg: text = text[1:-1]
+	if text[:1] == '-':
+		neg = not neg
+		text = text[1:]
+
+	whole, _, frac = text.lstrip('$').replace(',', '').partition('.')
+	cents = int(whole or 0) * 100 + (int((frac + '0')[:2]) if frac else 0)
+
+	return -cents if neg else cents
+
+def to_cents(value):
+	'''Converts a dollar amount given as a string or a number to integer cents'''
+	if isinstance(value, str): return parse_cents(value.strip()) if value.strip() else 0
+	return int(round(value * 100))
+
+def to_dollars(cents):
+	return cents / 100
+
+def format_cents(cents):
+	'''Formats cents the way the page does: $1,234.56, or ($1,234.56) when negative'''
+	text = f'${abs(cents) // 100:,}.{abs(cents) % 100:02d}'
+	return f'({text})' if cents < 0 else text
@@ -0,0 +1,97 @@
+'''Commission plans
+
+Each department's plan is data in plans/<name>.json: its brackets, rates, how
+each sale type counts and which catalog departments count as its own. Plans are compiled once when loaded into a bracket
+lookup table and a per sale type rule table, so one engine evaluates them all.
+'''
+from bisect import bisect_right
+from math import inf
+import os
+
+from money import to_cents
+
+PLANS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plans')
+DEFAULT_PLAN = 'gsa'
+LOOKUP_LIMIT = 1 << 16 # Prices below this many cents are bracketed with a table lookup, the rest with bisect
+
+
+class Rule:
+	'''How rows of one sale type count towards commission
+
+	bracket_by -- 'unit_price', or 'total' to bracket by the row's absolute total
+	into -- 'sales' or 'returns'
+	service_plans -- whether service plans on these rows go to the service plan total
+	net_legs -- whether the rows of a transaction are netted against each other per bracket, e.g. the two legs of an exchange
+	'''
+	__slots__ = ('by_total', 'returns', 'service_plans', 'net_legs')
+
+	def __init__(self, bracket_by='unit_price', into='sales', service_plans=False, net_legs=False):
+		if bracket_by not in ('unit_price', 'total'): raise ValueError(f'UNKNOWN BRACKET_BY {bracket_by!r}')
+		if into not in ('sales', 'returns'): raise ValueError(f'UNKNOWN INTO {into!r}')
+
+		self.by_total = bracket_by == 'total'
+		self.returns = into == 'returns'
+		self.service_plans = service_plans
+		self.net_legs = net_legs
+
+
+class Plan:
+	def __init__(self, name, brackets, out_of_dept_rate, service_plan_rate, sale_types, departments=()):
+		self.name = name
+		self.bounds = tuple(to_cents(bracket['from']) for bracket in brackets) # Lower bound of each bracket, in cents
+		self.rates = tuple(bracket['rate'] for bracket in brackets)
+		self.labels = tuple(bracket.get('label', f'{bracket["rate"] * 100:g}% Bracket') for bracket in brackets)
+		self.out_of_dept_rate = out_of_dept_rate
+		self.service_plan_rate = service_plan_rate
+		self.rules = {sale_type: Rule(**rule) for sale_type, rule in sale_types.items()}
+		self.departments = frozenset(department.lower() for department in departments) # Catalog departments that count as in department
+
+		if not self.bounds or self.bounds[0] != 0: raise ValueError('FIRST BRACKET MUST START AT 0')
+		if list(self.bounds) != sorted(set(self.bounds)): raise ValueError('BRACKETS MUST BE IN INCREASING ORDER')
+		if len(self.bounds) > 255: raise ValueError('TOO MANY BRACKETS')
+
+		self._lookup = bytes(bisect_right(self.bounds, cents) - 1 for cents in range(min(self.bounds[-1], LOOKUP_LIMIT)))
+
+	def __repr__(self):
+		return f'Plan({self.name!r})'
+
+	@property
+	def ranges(self):
+		'''(low, high) of each bracket in dollars, for display'''
+		highs = [(bound - 1) / 100 for bound in self.bounds[1:]] + [inf]
+		return tuple((bound / 100, high) for bound, high in zip(self.bounds, highs))
+
+	def bucket(self, cents):
+		'''Index of the bracket a price in cents falls in'''
+		if cents < 0: raise ValueError('UNIT PRICE MUST BE NON-NEGATIVE')
+		if cents < len(self._lookup): return self._lookup[cents]
+
+		return bisect_right(self.bounds, cents) - 1
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(data['name'], data['brackets'], data['out_of_dept_rate'], data['service_plan_rate'], data['sale_types'], data.get('departments', ()))
+
+	@classmethod
+	def from_file(cls, path):
+		import json # Only when a plan is first loaded, not when the engine is imported
+
+		with open(path) as f:
+			return cls.from_dict(json.load(f))
+
+_loaded = {}
+
+def load_plan(name=None):
+	'''Returns the compiled plan for a department name (e.g. 'gsa'), a path to a plan file, or the default plan'''
+	if isinstance(name, Plan): return name
+	if name is None: name = DEFAULT_PLAN
+
+	plan = _loaded.get(name)
+	if plan is None:
+		path = name if os.path.isfile(name) else os.path.join(PLANS_DIR, f'{name.lower()}.json')
+		plan = _loaded[name] = Plan.from_file(path)
+
+	return plan
+
+def available_plans():
+	return sorted(entry[:-5] for entry in os.listdir(PLANS_DIR) if entry.endswith('.json'))
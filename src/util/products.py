@@ -0,0 +1,123 @@
+'''Product classification cache
+
+Whether a row is a service plan only depends on the product, and the same
+products come up over and over, so the category is worked out once per SKU (or
+per description for rows without one) and kept in a bounded LRU cache. Known
+plan SKUs are seeded up front, and the cache can be saved to and loaded from a
+JSON file so it carries over between runs. The calculator's worker thread and
+its main thread share PRODUCTS, so changes to the cache hold a lock.
+'''
+from collections import OrderedDict
+from threading import Lock
+import os
+
+SERVICE_PLAN = 'service plan'
+REGULAR = 'regular'
+CATEGORIES = (SERVICE_PLAN, REGULAR)
+CACHE_SIZE = 1 << 16
+CACHE_PATH = os.environ.get('COMMISSION_PRODUCT_CACHE') or os.path.join(os.path.expanduser('~'), '.commission_calculator', 'products.json')
+
+# Replacement and protection plans seen on Sales Lookup pages
+KNOWN_SERVICE_PLAN_SKUS = ('021766', '021840', '023689', '024125', '024158', '024364', '025809', '026419', '443218', '793760')
+
+
+def classify_description(description):
+	'''Category of a product from its lowercased description, e.g. '2 year replacement plan' is a service plan'''
+	split = description.split()
+
+	return SERVICE_PLAN if split[0].isdigit() and split[1] == 'year' and split[-1] == 'plan' else REGULAR
+
+
+class ProductCache:
+	def __init__(self, size=CACHE_SIZE):
+		self.size = size
+		self.categories = OrderedDict() # SKU or description to category, least recently used first
+		self.lock = Lock() # Between looking a key up and moving it, another thread could evict it
+
+	def __len__(self):
+		return len(self.categories)
+
+	def category(self, sku, description):
+		'''Category of the product, SERVICE_PLAN or REGULAR'''
+		return self.lookup(sku or description, description)
+
+	def lookup(self, key, description):
+		'''category() for a key already worked out, e.g. bound once as the engine's per row call'''
+		categories = self.categories
+
+		with self.lock:
+			category = categories.get(key)
+			if category is None: return self._add(key, description)
+
+			categories.move_to_end(key)
+			return category
+
+	def add(self, key, description):
+		'''Classifies a product not in the cache by its description and caches it under key'''
+		with self.lock:
+			return self._add(key, description)
+
+	def _add(self, key, description):
+		category = self.categories[key] = classify_description(description)
+		if len(self.categories) > self.size: self.categories.popitem(last=False)
+
+		return category
+
+	def is_service_plan(self, sku, description):
+		return self.category(sku, description) == SERVICE_PLAN
+
+	def seed(self, skus, category=SERVICE_PLAN):
+		'''Classifies skus up front, e.g. plans that don't follow the usual description'''
+		if category not in CATEGORIES: raise ValueError(f'UNKNOWN CATEGORY {category!r}')
+
+		with self.lock:
+			for sku in skus:
+				self.categories[sku] = category
+				self.categories.move_to_end(sku)
+
+			while len(self.categories) > self.size: self.categories.popitem(last=False)
+
+	def clear(self):
+		with self.lock:
+			self.categories.clear()
+
+	def load(self, path=CACHE_PATH):
+		'''Adds the entries saved at path as the most recently used, does nothing if there is no usable file'''
+		import json # Here and in save, so importing the engine doesn't pay for it
+
+		try:
+			with open(path) as f: entries = json.load(f)
+		except (OSError, ValueError):
+			return # Missing or unreadable, it just starts cold
+
+		with self.lock:
+			for key, category in entries:
+				if category in CATEGORIES: self.categories[key] = category
+			while len(self.categories) > self.size: self.categories.popitem(last=False)
+
+	def save(self, path=CACHE_PATH):
+		'''Writes the cache to path as a JSON list of [key, category], least recently used first'''
+		import json
+
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+		# Written alongside and then swapped in, so a crash never leaves a half written cache
+		tmp = f'{path}.tmp'
+		with self.lock:
+			entries = list(self.categories.items())
+		with open(tmp, 'w') as f: json.dump(entries, f)
+		os.replace(tmp, path)
+
+PRODUCTS = ProductCache()
+PRODUCTS.seed(KNOWN_SERVICE_PLAN_SKUS)
+
+def load_cache(path=CACHE_PATH):
+	'''Loads the saved cache into PRODUCTS, e.g. as a worker process initializer'''
+	PRODUCTS.load(path)
+
+def save_cache(path=CACHE_PATH):
+	'''Saves PRODUCTS, ignoring failures since the cache can always be rebuilt'''
+	try:
+		PRODUCTS.save(path)
+	except OSError:
+		pass
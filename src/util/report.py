@@ -0,0 +1,192 @@
+'''Store wide report of every associate's commission, with leaderboards
+
+Usage: python report.py [-o OUTPUT] [-f {csv,json}] [-j WORKERS] [-p PLAN]... [-k K]
+                        [--catalog FILE] PATH [PATH ...]
+
+Pages for any number of associates, stores and days are grouped by the Sales
+Person in their header. Workers each build a PersonalStats per associate and
+plan for a chunk of the pages, and these are merged per associate, so a
+region's pages can go through in one run. Associates are then streamed through
+bounded heaps that keep the top K by commission, service plan attach and
+effective rate.
+'''
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heapreplace
+import argparse
+import csv
+import json
+import os
+import sys
+
+import engine
+from batch import find_pages, split_pages
+from catalog import load_catalog
+from products import load_cache, save_cache
+
+RESULT_FIELDS = ('commission', 'sales_total', 'overall_rate', 'service_plan_total', 'customers', 'returns_count', 'returns_total', 'returns_commission_lost', 'out_of_dept_total')
+PERSON_FIELDS = ('sales_person', 'stores', 'plan', 'service_plan_attach') + RESULT_FIELDS
+LEADERBOARDS = {'commission': 'commission', 'attach': 'service_plan_attach', 'rate': 'overall_rate'}
+TOP_K = 10
+
+
+class Leaderboard:
+	'''Top k of a stream of (score, name), kept in a min-heap of k entries so each push is O(log k)'''
+
+	def __init__(self, k=TOP_K):
+		self.k = k
+		self.heap = [] # Lowest score of the top k first
+
+	def push(self, score, name):
+		entry = (score, name)
+		if len(self.heap) < self.k:
+			heappush(self.heap, entry)
+		elif entry > self.heap[0]:
+			heapreplace(self.heap, entry)
+
+	def top(self):
+		'''(score, name) best first'''
+		return sorted(self.heap, reverse=True)
+
+
+class People:
+	'''PersonalStats per associate and plan, and the stores each associate's pages came from'''
+
+	def __init__(self, plans=(None,), catalog=None):
+		self.plans = plans
+		self.catalog = catalog
+		self.stats = {} # Sales person to a PersonalStats per plan
+		self.stores = {} # Sales person to the set of stores
+
+	def add_page(self, page):
+		person = page.header.sales_person or ''
+		all_stats = self.stats.get(person)
+		if all_stats is None:
+			all_stats = self.stats[person] = [engine.PersonalStats(plan, self.catalog) for plan in self.plans]
+			self.stores[person] = set()
+
+		if page.header.store: self.stores[person].add(page.header.store)
+		for stats in all_stats:
+			engine.calc_commission(page.items, (), stats)
+			engine.count_customers(page.items, stats)
+
+	def add_file(self, path):
+		with open(path, encoding='utf-8', errors='replace') as f:
+			for page in engine.iter_file_pages(path, f): self.add_page(page)
+
+	def merge(self, other):
+		'''Adds the associates of other, merging the stats of anyone in both'''
+		for person, all_stats in other.stats.items():
+			mine = self.stats.get(person)
+			if mine is None:
+				self.stats[person] = all_stats
+				self.stores[person] = other.stores[person]
+			else:
+				for stats, theirs in zip(mine, all_stats): stats.merge(theirs)
+				self.stores[person] |= other.stores[person]
+
+		return self
+
+	def __getstate__(self):
+		return dict(self.__dict__, catalog=None)
+
+	def rows(self):
+		'''A result row per associate and plan, dollars as in engine.Results'''
+		for person in sorted(self.stats):
+			for stats in self.stats[person]:
+				engine.apply_deductions((), stats)
+				results = engine.Results(stats)
+
+				row = {'sales_person': person, 'stores': '; '.join(sorted(self.stores[person])), 'plan': stats.plan.name,
+						'service_plan_attach': results.service_plan_total / results.sales_total if results.sales_total else 0}
+				row.update((field, getattr(results, field)) for field in RESULT_FIELDS)
+				yield row
+
+def leaderboards(rows, k=TOP_K):
+	'''Streams result rows through a Leaderboard per plan and LEADERBOARDS entry
+
+	Outputs:
+	Dict of plan name to dict of leaderboard name to [(score, sales person)], best first
+	'''
+	boards = {}
+	for row in rows:
+		plan_boards = boards.setdefault(row['plan'], {name: Leaderboard(k) for name in LEADERBOARDS})
+		for name, field in LEADERBOARDS.items(): plan_boards[name].push(row[field], row['sales_person'])
+
+	return {plan_name: {name: board.top() for name, board in plan_boards.items()} for plan_name, plan_boards in boards.items()}
+
+def chunk_people(paths, plans=(None,), catalog_path=None):
+	'''Worker: People for the pages at paths'''
+	people = People(plans, load_catalog(catalog_path) if catalog_path else None)
+	for path in paths: people.add_file(path)
+
+	return people
+
+def run(pages, workers=None, plans=(None,), catalog_path=None):
+	'''Groups every page by associate across a process pool, returns the merged People'''
+	if workers == 1 or len(pages) < 2:
+		return chunk_people(pages, plans, catalog_path)
+
+	workers = workers or os.cpu_count() or 1
+	parts = split_pages(pages, workers * 4)
+
+	with ProcessPoolExecutor(max_workers=workers, initializer=load_cache) as pool:
+		chunks = list(pool.map(chunk_people, parts, [plans] * len(parts), [catalog_path] * len(parts)))
+
+	# Tree style, like engine.merge_stats
+	while len(chunks) > 1:
+		chunks = [chunks[i].merge(chunks[i + 1]) if i + 1 < len(chunks) else chunks[i] for i in range(0, len(chunks), 2)]
+
+	return chunks[0]
+
+def format_leaderboards(boards):
+	lines = []
+	for plan_name, plan_boards in boards.items():
+		for name, top in plan_boards.items():
+			lines.append(f'{plan_name} top {len(top)} by {name}:')
+			lines.extend(f'{rank:>4}. {person:<20} {score:>12.4f}' for rank, (score, person) in enumerate(top, 1))
+
+	return '\n'.join(lines)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Commission for every associate in a store or region, with leaderboards')
+	parser.add_argument('paths', nargs='+', help='page files, directories or globs')
+	parser.add_argument('-o', '--output', help='file to write to (default: stdout)')
+	parser.add_argument('-f', '--format', choices=('csv', 'json'), help='output format (default: from output extension, else csv)')
+	parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per core)')
+	parser.add_argument('-p', '--plan', action='append', dest='plans', help='commission plan name or file, may be repeated (default: gsa)')
+	parser.add_argument('-k', '--top', type=int, default=TOP_K, help=f'leaderboard length (default: {TOP_K})')
+	parser.add_argument('--catalog', metavar='FILE', help='SKU to department catalog (index or .csv) to deduct out of department sales with')
+	args = parser.parse_args(argv)
+
+	fmt = args.format
+	if fmt is None: fmt = 'json' if args.output and args.output.lower().endswith('.json') else 'csv'
+
+	pages = find_pages(args.paths)
+	if not pages: parser.error('no pages found')
+
+	load_cache() # Workers load it too, this process saves what it learned at the end
+	try:
+		people = run(pages, args.workers, args.plans or (None,), args.catalog)
+	except engine.SharedRowsError:
+		parser.error('the same rows were saved in files starting with different pages, -j 1 adds them once')
+
+	rows = list(people.rows())
+	boards = leaderboards(rows, args.top)
+
+	out = open(args.output, 'w', newline='' if fmt == 'csv' else None) if args.output else sys.stdout
+	try:
+		if fmt == 'json':
+			json.dump({'people': rows, 'leaderboards': boards}, out, indent=2)
+			out.write('\n')
+		else:
+			writer = csv.DictWriter(out, fieldnames=PERSON_FIELDS)
+			writer.writeheader()
+			writer.writerows(rows)
+			print(format_leaderboards(boards), file=sys.stderr)
+	finally:
+		if out is not sys.stdout: out.close()
+
+	save_cache()
+
+if __name__ == '__main__':
+	main()
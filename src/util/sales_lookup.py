@@ -0,0 +1,125 @@
+'''Streaming parser for Sales Lookup pages
+
+Works on any iterable of lines (an open file, a list, a generator) and never
+holds more than the page currently being read, so arbitrarily long exports with
+many concatenated pages can be processed in flat memory.
+'''
+from itertools import groupby
+from sys import intern
+
+from money import parse_cents
+
+PAGE_MARKER = 'sales lookup - '
+HEADER_FIELDS = {'date': 'date', 'store': 'store', 'sales person': 'sales_person'}
+TABLE_COLS = 8
+TOTAL_MARKERS = ('total: $', 'total: ($') # The line above the table, the day's total is in brackets when negative
+HTML_SUFFIXES = ('.html', '.htm') # Pages saved as HTML, read by sales_lookup_html
+
+
+class PageHeader:
+	'''The details block at the top of a Sales Lookup page'''
+
+	def __init__(self, date=None, store=None, sales_person=None):
+		self.date = date
+		self.store = store
+		self.sales_person = sales_person
+		self.total = None # Text of the 'Total: $' line above the table
+
+	def __repr__(self):
+		return f'PageHeader(date={self.date!r}, store={self.store!r}, sales_person={self.sales_person!r})'
+
+
+class LineItem:
+	'''One row of the transaction table
+
+	Only the columns the engine uses are kept, amounts are parsed to cents once
+	and repeated strings (sale types, skus, descriptions) are interned.
+	'''
+	__slots__ = ('transaction', 'sale_type', 'line', 'sku', 'description', 'qty', 'unit_price', 'total')
+
+	def __init__(self, transaction, sale_type, line, sku, description, qty, unit_price, total):
+		self.transaction = transaction
+		self.sale_type = sale_type
+		self.line = line
+		self.sku = sku
+		self.description = description
+		self.qty = qty
+		self.unit_price = unit_price
+		self.total = total
+
+	@classmethod
+	def from_row(cls, row):
+		'''Builds a LineItem from the 8 split columns, or returns None for junk rows'''
+		try:
+			return cls(intern(row[0]), intern(row[1]), int(row[2]), intern(row[3]), intern(row[4]),
+					int(row[5]), parse_cents(row[6]), parse_cents(row[7]))
+		except (ValueError, IndexError):
+			return None
+
+	@property
+	def key(self):
+		'''Identifies the row across pastes. Qty tells apart the two legs of an exchange for the same SKU'''
+		return self.transaction, self.sale_type, self.line, self.sku, self.qty
+
+	def __repr__(self):
+		return f'LineItem({", ".join(repr(getattr(self, field)) for field in self.__slots__)})'
+
+
+class Page:
+	def __init__(self, header, items):
+		self.header = header
+		self.items = items
+
+
+def iter_line_items(lines):
+	'''Yields (header, item) for every transaction row of every page in lines
+
+	Inputs:
+	lines -- iterable of text lines, with or without line endings
+
+	Outputs:
+	Generator of (PageHeader, LineItem) with text columns lowercased. Rows from
+	the same page share the same PageHeader object.
+	'''
+	header = PageHeader()
+	in_table = False
+	header_used = False
+	pending_field = None
+	prev = ''
+
+	for line in lines:
+		line = line.strip().lower()
+
+		if in_table:
+			row = line.split('\t')
+			if len(row) == TABLE_COLS:
+				item = LineItem.from_row(row)
+				if item is not None:
+					yield header, item
+					continue
+
+		if line.startswith(PAGE_MARKER):
+			header = PageHeader(date=line[len(PAGE_MARKER):])
+			in_table = header_used = False
+			pending_field = None
+		elif prev == 'total' and line.startswith(TOTAL_MARKERS):
+			# Pages pasted without their details block still get a header of their own
+			if header_used: header = PageHeader()
+
+			header.total = line[7:]
+			in_table = header_used = True
+		elif pending_field:
+			setattr(header, pending_field, line)
+			pending_field = None
+		elif not in_table and line in HEADER_FIELDS:
+			pending_field = HEADER_FIELDS[line]
+
+		prev = line
+
+def is_html(path):
+	return path.lower().endswith(HTML_SUFFIXES)
+
+def iter_pages(lines):
+	'''Yields a Page for every page in lines, holding only one page's rows at a time'''
+	for header, group in groupby(iter_line_items(lines), key=lambda pair: pair[0]):
+		yield Page(header, [item for _, item in group])
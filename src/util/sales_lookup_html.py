@@ -0,0 +1,131 @@
+'''Streaming parser for Sales Lookup pages saved as HTML
+
+Saved pages keep the real table structure, so rows are taken from <tr>s with
+exactly TABLE_COLS cells instead of guessing from tabs in the rendered text.
+The page is fed to the stdlib event based HTMLParser in chunks and rows are
+yielded as their </tr> is reached, so memory stays flat however large the
+file, and only the text that is kept is lowercased.
+
+Yields the same PageHeader/LineItem/Page objects as sales_lookup, so everything
+downstream works unchanged.
+'''
+from html.parser import HTMLParser
+from itertools import groupby
+
+from sales_lookup import HEADER_FIELDS, HTML_SUFFIXES, PAGE_MARKER, TABLE_COLS, TOTAL_MARKERS, LineItem, Page, PageHeader, is_html
+
+CHUNK_SIZE = 1 << 16
+SKIP_TAGS = ('script', 'style')
+
+
+class SalesLookupParser(HTMLParser):
+	'''Collects (header, item) pairs as the page is fed in, take them with drain()'''
+
+	def __init__(self):
+		super().__init__()
+		self.header = PageHeader()
+		self.header_used = False
+		self.pending_field = None
+		self.found = []
+		self.row = None # Text of each cell of the <tr> being read
+		self.cell = None # Pieces of text of the <td>/<th> being read
+		self.skip = 0
+
+	def drain(self):
+		found, self.found = self.found, []
+		return found
+
+	def handle_starttag(self, tag, attrs):
+		if tag == 'tr':
+			# End tags for rows and cells are optional in HTML
+			self.end_row()
+			self.row = []
+		elif tag in ('td', 'th'):
+			self.end_cell()
+			self.cell = []
+		elif tag in SKIP_TAGS:
+			self.skip += 1
+		elif tag == 'br' and self.cell is not None:
+			self.cell.append(' ')
+
+	def handle_endtag(self, tag):
+		if tag in ('td', 'th'):
+			self.end_cell()
+		elif tag in ('tr', 'table'):
+			self.end_row()
+		elif tag in SKIP_TAGS:
+			self.skip = max(0, self.skip - 1)
+
+	def handle_data(self, data):
+		if self.skip: return
+
+		if self.cell is not None:
+			self.cell.append(data)
+		else:
+			self.handle_text(data)
+
+	def end_cell(self):
+		if self.cell is None: return
+
+		text = ' '.join(''.join(self.cell).split())
+		self.cell = None
+
+		if self.row is not None: self.row.append(text)
+		self.handle_text(text)
+
+	def end_row(self):
+		self.end_cell()
+		if self.row is None: return
+
+		row, self.row = self.row, None
+		if len(row) == TABLE_COLS:
+			item = LineItem.from_row([cell.lower() for cell in row])
+			if item is not None:
+				self.header_used = True
+				self.found.append((self.header, item))
+
+	def handle_text(self, text):
+		'''Picks the header fields out of text outside the transaction rows, as sales_lookup does'''
+		text = text.strip()
+		if not text: return
+
+		line = text.lower()
+		if line.startswith(PAGE_MARKER):
+			self.header = PageHeader(date=line[len(PAGE_MARKER):])
+			self.header_used = False
+			self.pending_field = None
+		elif line.startswith(TOTAL_MARKERS):
+			if self.header_used: self.header = PageHeader()
+			self.header.total = line[7:]
+		elif self.pending_field:
+			setattr(self.header, self.pending_field, line)
+			self.pending_field = None
+		elif not self.header_used and line in HEADER_FIELDS:
+			self.pending_field = HEADER_FIELDS[line]
+
+def iter_html_line_items(chunks):
+	'''Yields (header, item) for every transaction row in the HTML fed in as chunks of text
+
+	Inputs:
+	chunks -- iterable of str pieces of one or more saved pages, e.g. read_chunks(f)
+
+	Outputs:
+	Generator of (PageHeader, LineItem), the same as sales_lookup.iter_line_items
+	'''
+	parser = SalesLookupParser()
+
+	for chunk in chunks:
+		parser.feed(chunk)
+		yield from parser.drain()
+
+	parser.close()
+	parser.end_row()
+	yield from parser.drain()
+
+def iter_html_pages(chunks):
+	'''Yields a Page for every page in the HTML chunks'''
+	for header, group in groupby(iter_html_line_items(chunks), key=lambda pair: pair[0]):
+		yield Page(header, [item for _, item in group])
+
+def read_chunks(f, size=CHUNK_SIZE):
+	return iter(lambda: f.read(size), '')
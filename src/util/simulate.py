@@ -0,0 +1,200 @@
+'''What-if simulation of many commission plans over the same sales
+
+Usage: python simulate.py -p PLAN [-p PLAN ...] [-o OUTPUT] PATH [PATH ...]
+
+Each PLAN is a plan name, a plan file, or a JSON file holding a list of plans.
+The pages are read once. Every row is placed in a segment of the union of all
+the plans' bracket bounds and summed into a per associate feature vector, then
+payouts for every plan come from one multiply against a plan weight matrix.
+Netting the legs of a transaction isn't linear, so rows of sale types a plan
+nets are kept aside and run through the engine per plan instead. Out of
+department deductions are not simulated.
+'''
+from bisect import bisect_right
+import argparse
+import csv
+import json
+import sys
+
+from batch import find_pages
+from engine import PersonalStats, add_leg, iter_file_pages
+from money import to_dollars
+from plan import Plan, load_plan
+from products import PRODUCTS
+from sales_lookup import iter_pages
+
+# Feature groups for each sale type: rows bracketed by unit price or by absolute
+# total, split by whether the row is a service plan
+UNIT, UNIT_PLAN, TOTAL, TOTAL_PLAN = range(4)
+N_GROUPS = 4
+RESULT_FIELDS = ('commission', 'sales_total', 'overall_rate', 'returns_commission_lost')
+
+
+class Simulation:
+	def __init__(self, plans):
+		self.plans = [load_plan(plan) for plan in plans]
+		self.bounds = sorted({bound for plan in self.plans for bound in plan.bounds})
+		self.sale_types = {sale_type: i for i, sale_type in enumerate(sorted({s for plan in self.plans for s in plan.rules}))}
+		self.netted = {sale_type for plan in self.plans for sale_type, rule in plan.rules.items() if rule.net_legs}
+		self.n_features = len(self.sale_types) * N_GROUPS * len(self.bounds)
+
+		# One (commission, sales, returns) column triple per plan
+		self.weights = [column for plan in self.plans for column in self.plan_weights(plan)]
+
+		self.features = {} # Sales person to feature vector, in cents
+		self.seen_rows = {} # Sales person to LineItem.key of rows already added
+		self.legs = {} # Sales person to (LineItem, is service plan) of the rows of netted sale types
+
+	def feature(self, sale_type_index, group, segment):
+		return (sale_type_index * N_GROUPS + group) * len(self.bounds) + segment
+
+	def plan_weights(self, plan):
+		'''Columns that turn a feature vector into commission, sales and returns commission lost under plan'''
+		commission, sales, returns = ([0] * self.n_features for _ in range(3))
+
+		for sale_type, t in self.sale_types.items():
+			rule = plan.rules.get(sale_type)
+			if rule is None: continue
+
+			groups = (TOTAL, TOTAL_PLAN) if rule.by_total else (UNIT, UNIT_PLAN)
+			for k, bound in enumerate(self.bounds):
+				rate = plan.rates[plan.bucket(bound)]
+
+				for group in groups:
+					if rule.net_legs or (rule.service_plans and group in (UNIT_PLAN, TOTAL_PLAN)): continue
+
+					i = self.feature(t, group, k)
+					if rule.returns:
+						returns[i] = rate
+					else:
+						commission[i] = rate
+						sales[i] = 1
+
+				# Service plans are taken at their signed total whatever the bracket
+				if rule.service_plans:
+					i = self.feature(t, UNIT_PLAN, k)
+					commission[i] = plan.service_plan_rate
+					sales[i] = 1
+
+		return commission, sales, returns
+
+	def add(self, header, item):
+		t = self.sale_types.get(item.sale_type)
+		if t is None: return
+
+		person = header.sales_person or ''
+		seen_rows = self.seen_rows.setdefault(person, set())
+		if item.key in seen_rows: return
+		seen_rows.add(item.key)
+
+		features = self.features.get(person)
+		if features is None: features = self.features[person] = [0] * self.n_features
+
+		service_plan = PRODUCTS.is_service_plan(item.sku, item.description)
+		if item.sale_type in self.netted: self.legs.setdefault(person, []).append((item, service_plan))
+
+		total = item.total
+		# Negative unit prices only appear on exchange and return legs, which are bracketed by total
+		unit_segment = max(bisect_right(self.bounds, item.unit_price) - 1, 0)
+		features[self.feature(t, UNIT_PLAN if service_plan else UNIT, unit_segment)] += total
+		features[self.feature(t, TOTAL_PLAN if service_plan else TOTAL, bisect_right(self.bounds, abs(total)) - 1)] += abs(total)
+
+	def add_pages(self, pages):
+		for page in pages:
+			for item in page.items: self.add(page.header, item)
+
+	def add_lines(self, lines):
+		self.add_pages(iter_pages(lines))
+
+	def add_file(self, path):
+		'''Adds the pages in the file at path, the copied text or the page saved as HTML'''
+		with open(path, encoding='utf-8', errors='replace') as f: self.add_pages(iter_file_pages(path, f))
+
+	def results(self):
+		'''Returns rows of sales person, plan name and the RESULT_FIELDS in dollars, one per pair'''
+		people = sorted(self.features)
+		products = multiply([self.features[person] for person in people], self.weights)
+
+		rows = []
+		for person, product in zip(people, products):
+			for p, plan in enumerate(self.plans):
+				commission, sales, returns = product[3*p:3*p+3]
+				if person in self.legs:
+					legs_commission, legs_sales, legs_returns = self.net_legs(plan, self.legs[person])
+					commission, sales, returns = commission + legs_commission, sales + legs_sales, returns + legs_returns
+
+				rows.append({
+					'sales_person': person,
+					'plan': plan.name,
+					'commission': to_dollars(commission),
+					'sales_total': to_dollars(sales),
+					'overall_rate': commission / sales if sales else 0,
+					'returns_commission_lost': to_dollars(returns),
+				})
+
+		return rows
+
+	@staticmethod
+	def net_legs(plan, legs):
+		'''(commission, sales, returns commission lost) in cents of the netted rows in legs under plan'''
+		stats = PersonalStats(plan)
+
+		for item, service_plan in legs:
+			rule = plan.rules.get(item.sale_type)
+			if rule is None or not rule.net_legs or (rule.service_plans and service_plan): continue
+			add_leg(item, rule, stats)
+
+		commission = sum(total * rate for total, rate in zip(stats.bucket_totals, plan.rates))
+		returns = sum(total * rate for total, rate in zip(stats.returns_totals, plan.rates))
+		return commission, sum(stats.bucket_totals), returns
+
+def multiply(features, weights):
+	'''features (people x F) times the columns in weights (F x columns)'''
+	if not features: return []
+
+	try:
+		import numpy as np
+	except ImportError:
+		np = None
+
+	if np is not None:
+		return (np.array(features, dtype=np.float64) @ np.array(weights, dtype=np.float64).T).tolist()
+
+	products = []
+	for row in features:
+		nonzero = [(i, value) for i, value in enumerate(row) if value]
+		products.append([sum(value * column[i] for i, value in nonzero) for column in weights])
+
+	return products
+
+def load_variants(spec):
+	'''Plans named by spec: a plan name, a plan file, or a JSON file with a list of plans'''
+	if spec.lower().endswith('.json'):
+		with open(spec) as f: data = json.load(f)
+		if isinstance(data, list): return [Plan.from_dict(variant) for variant in data]
+
+	return [load_plan(spec)]
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Compare commission under several plans over the same pages')
+	parser.add_argument('paths', nargs='+', help='page files, directories or globs')
+	parser.add_argument('-p', '--plan', action='append', dest='plans', required=True, help='plan name, plan file or JSON list of plans, may be repeated')
+	parser.add_argument('-o', '--output', help='CSV file to write to (default: stdout)')
+	args = parser.parse_args(argv)
+
+	pages = find_pages(args.paths)
+	if not pages: parser.error('no pages found')
+
+	simulation = Simulation([plan for spec in args.plans for plan in load_variants(spec)])
+	for page in pages: simulation.add_file(page)
+
+	out = open(args.output, 'w', newline='') if args.output else sys.stdout
+	try:
+		writer = csv.DictWriter(out, fieldnames=('sales_person', 'plan') + RESULT_FIELDS)
+		writer.writeheader()
+		writer.writerows(simulation.results())
+	finally:
+		if out is not sys.stdout: out.close()
+
+if __name__ == '__main__':
+	main()
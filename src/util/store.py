@@ -0,0 +1,314 @@
+'''Persistent store of ingested Sales Lookup pages
+
+Usage: python store.py [--db FILE] add PATH [PATH ...]
+       python store.py [--db FILE] report [--person NAME] [--store NAME] [--from DATE] [--to DATE] [-p PLAN]...
+
+Parsed rows and their page headers are written in bulk to a local SQLite
+database, so sales survive closing the calculator and a period can be worked
+out again without re-pasting its pages. Rows are deduplicated on insert by the
+same key the engine uses, so ingesting a page twice changes nothing.
+
+Dates are stored as ISO 'YYYY-MM-DD' text so they sort and range-compare, and
+line items are indexed on (sales_person, date) for period queries and on
+(transaction_number, line) for finding a transaction.
+
+Each plan's totals are also kept per associate per day in daily_rollups. An
+ingest throws away the rollups of the days it added rows to and works out just
+those days again, so reports over any period only sum a row per day and never
+read the line items. Rollups for a plan that hasn't been reported on yet are
+built the first time they're asked for. Out of department totals depend on the
+catalog in use, call rebuild() after changing it.
+'''
+from datetime import date, datetime
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+import engine
+from batch import RESULT_FIELDS, find_pages
+from plan import load_plan
+from products import load_cache, save_cache
+from sales_lookup import LineItem, PageHeader
+
+STORE_PATH = os.environ.get('COMMISSION_STORE') or os.path.join(os.path.expanduser('~'), '.commission_calculator', 'sales.db')
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d')
+ITEM_FIELDS = ('transaction_number', 'sale_type', 'line', 'sku', 'description', 'qty', 'unit_price', 'total')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+	date TEXT,
+	store TEXT NOT NULL,
+	sales_person TEXT NOT NULL,
+	total TEXT,
+	UNIQUE (sales_person, date, store)
+);
+CREATE TABLE IF NOT EXISTS line_items (
+	date TEXT,
+	store TEXT NOT NULL,
+	sales_person TEXT NOT NULL,
+	transaction_number TEXT NOT NULL,
+	sale_type TEXT NOT NULL,
+	line INTEGER NOT NULL,
+	sku TEXT NOT NULL,
+	description TEXT NOT NULL,
+	qty INTEGER NOT NULL,
+	unit_price INTEGER NOT NULL,
+	total INTEGER NOT NULL,
+	UNIQUE (transaction_number, line, sale_type, sku, qty)
+);
+CREATE INDEX IF NOT EXISTS line_items_person_date ON line_items (sales_person, date);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+	plan TEXT NOT NULL,
+	sales_person TEXT NOT NULL,
+	date TEXT NOT NULL,
+	store TEXT NOT NULL,
+	bucket_totals TEXT NOT NULL,
+	service_plan_total INTEGER NOT NULL,
+	out_of_dept_totals TEXT NOT NULL,
+	returns_totals TEXT NOT NULL,
+	returns_count INTEGER NOT NULL,
+	customers INTEGER NOT NULL,
+	net_total INTEGER NOT NULL,
+	PRIMARY KEY (plan, sales_person, date, store)
+);
+'''
+# The UNIQUE constraint's index leads with (transaction_number, line), so it doubles as that index
+# Per bracket totals in daily_rollups are JSON lists of cents, plans differ in how many brackets they have
+ROLLUP_FIELDS = ('bucket_totals', 'service_plan_total', 'out_of_dept_totals', 'returns_totals', 'returns_count', 'customers', 'net_total')
+VECTOR_FIELDS = ('bucket_totals', 'out_of_dept_totals', 'returns_totals')
+
+
+def iso_date(value):
+	'''A date ('2/15/2021', '2021-02-15' or a date object) as 'YYYY-MM-DD', None when there is no date'''
+	if value is None or isinstance(value, date): return value and value.isoformat()
+
+	value = value.strip()
+	for fmt in DATE_FORMATS:
+		try:
+			return datetime.strptime(value, fmt).date().isoformat()
+		except ValueError:
+			pass
+
+	raise ValueError(f'UNKNOWN DATE {value!r}')
+
+def header_values(header):
+	'''(date, store, sales_person) of a PageHeader as stored, dates that don't parse are kept as NULL'''
+	try:
+		day = iso_date(header.date)
+	except ValueError:
+		day = None
+
+	return day, header.store or '', header.sales_person or ''
+
+
+class SalesStore:
+	def __init__(self, path=STORE_PATH, plans=(None,), catalog=None):
+		'''
+		Inputs:
+		path -- database file, created if missing
+		plans -- plans whose daily rollups are kept up to date on every ingest
+		catalog -- optional catalog.Catalog to find out of department sales with
+		'''
+		if path != ':memory:': os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+		self.path = path
+		self.plans = [load_plan(plan) for plan in plans]
+		self.catalog = catalog
+		self.db = sqlite3.connect(path)
+		self.db.execute('PRAGMA journal_mode=WAL')
+		self.db.execute('PRAGMA synchronous=NORMAL')
+		self.db.executescript(SCHEMA)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		self.db.close()
+
+	def __len__(self):
+		return self.db.execute('SELECT count(*) FROM line_items').fetchone()[0]
+
+	# ----------------------------------------------------------- Ingest
+	def add_pages(self, pages):
+		'''Writes pages to the store in one transaction
+
+		Inputs:
+		pages -- iterable of sales_lookup.Page, e.g. from engine.iter_file_pages
+
+		Outputs:
+		Number of rows that weren't already stored
+		'''
+		added = 0
+		days = set() # (sales_person, date, store) that got new rows
+
+		with self.db:
+			for page in pages:
+				values = header_values(page.header)
+				self.db.execute('INSERT OR IGNORE INTO pages VALUES (?, ?, ?, ?)', values + (page.header.total,))
+				cursor = self.db.executemany(f'INSERT OR IGNORE INTO line_items VALUES ({", ".join("?" * 11)})',
+						[values + (item.transaction, item.sale_type, item.line, item.sku, item.description, item.qty, item.unit_price, item.total) for item in page.items])
+
+				added += cursor.rowcount
+				if cursor.rowcount > 0 and values[0] is not None: days.add((values[2], values[0], values[1]))
+
+			self.db.executemany('DELETE FROM daily_rollups WHERE sales_person = ? AND date = ? AND store = ?', days)
+			for plan in self.plans: self.refresh(plan)
+
+		return added
+
+	def add_file(self, path):
+		with open(path, encoding='utf-8', errors='replace') as f:
+			return self.add_pages(engine.iter_file_pages(path, f))
+
+	# ----------------------------------------------------------- Queries
+	def where(self, sales_person=None, store=None, start=None, end=None):
+		'''SQL condition and parameters selecting rows by associate, store and inclusive date range'''
+		conditions, params = [], []
+
+		if sales_person is not None:
+			conditions.append('sales_person = ?')
+			params.append(sales_person.lower())
+		if store is not None:
+			conditions.append('store = ?')
+			params.append(store.lower())
+		if start is not None:
+			conditions.append('date >= ?')
+			params.append(iso_date(start))
+		if end is not None:
+			conditions.append('date <= ?')
+			params.append(iso_date(end))
+
+		return ' AND '.join(conditions) or '1', params
+
+	def iter_items(self, sales_person=None, store=None, start=None, end=None):
+		'''Yields (PageHeader, LineItem) for the stored rows matching the filters, see where()'''
+		condition, params = self.where(sales_person, store, start, end)
+		cursor = self.db.execute(f'SELECT date, store, sales_person, {", ".join(ITEM_FIELDS)} FROM line_items WHERE {condition} ORDER BY sales_person, date', params)
+
+		header = None
+		for row in cursor:
+			if header is None or (header.date, header.store, header.sales_person) != row[:3]: header = PageHeader(*row[:3])
+			yield header, LineItem(*row[3:])
+
+	def stats(self, sales_person=None, store=None, start=None, end=None, plan=None, catalog=None):
+		'''PersonalStats over the stored rows matching the filters, e.g. one associate's pay period or a store's month'''
+		stats = engine.PersonalStats(plan, catalog)
+		items = [item for _, item in self.iter_items(sales_person, store, start, end)]
+
+		engine.add_rows(engine.new_rows(items, stats), stats)
+		engine.count_customers(items, stats)
+		engine.apply_deductions((), stats)
+
+		return stats
+
+	def results(self, sales_person=None, store=None, start=None, end=None, plan=None, catalog=None):
+		return engine.Results(self.stats(sales_person, store, start, end, plan, catalog))
+
+	# ----------------------------------------------------------- Rollups
+	def refresh(self, plan=None):
+		'''Works out the rollups under plan of every stored day that doesn't have one yet, returns how many'''
+		plan = load_plan(plan)
+		days = self.db.execute('''SELECT sales_person, date, store FROM pages WHERE date IS NOT NULL AND NOT EXISTS
+				(SELECT 1 FROM daily_rollups r WHERE r.plan = ? AND r.sales_person = pages.sales_person AND r.date = pages.date AND r.store = pages.store)''', (plan.name,)).fetchall()
+
+		with self.db:
+			for sales_person, day, store in days:
+				stats = self.stats(sales_person, store, day, day, plan, self.catalog)
+				values = [getattr(stats, field) for field in ROLLUP_FIELDS[:5]] + [len(stats.seen_custs), stats.net_total]
+				values = [json.dumps(value) if field in VECTOR_FIELDS else value for field, value in zip(ROLLUP_FIELDS, values)]
+				self.db.execute(f'INSERT OR REPLACE INTO daily_rollups VALUES (?, ?, ?, ?, {", ".join("?" * len(ROLLUP_FIELDS))})', [plan.name, sales_person, day, store] + values)
+
+		return len(days)
+
+	def rebuild(self):
+		'''Throws away every rollup and works out those of the kept plans again, e.g. after changing the catalog'''
+		with self.db:
+			self.db.execute('DELETE FROM daily_rollups')
+			for plan in self.plans: self.refresh(plan)
+
+	def rollup_stats(self, sales_person=None, store=None, start=None, end=None, plan=None):
+		'''Sums the daily rollups matching the filters, see where()
+
+		Outputs:
+		(PersonalStats, number of customers). The stats hold the totals but not the
+		customers or rows themselves, so they can't be added to.
+		'''
+		plan = load_plan(plan)
+		self.refresh(plan)
+
+		condition, params = self.where(sales_person, store, start, end)
+		stats = engine.PersonalStats(plan, self.catalog)
+		customers = 0
+
+		for row in self.db.execute(f'SELECT {", ".join(ROLLUP_FIELDS)} FROM daily_rollups WHERE plan = ? AND {condition}', [plan.name] + params):
+			day = dict(zip(ROLLUP_FIELDS, row))
+			for field in VECTOR_FIELDS:
+				setattr(stats, field, [total + day_total for total, day_total in zip(getattr(stats, field), json.loads(day[field]))])
+
+			stats.service_plan_total += day['service_plan_total']
+			stats.returns_count += day['returns_count']
+			stats.net_total += day['net_total']
+			customers += day['customers']
+
+		engine.apply_deductions((), stats)
+		return stats, customers
+
+	def report(self, sales_person=None, store=None, start=None, end=None, plan=None):
+		'''Results for a period from the daily rollups alone, e.g. a pay period or year to date'''
+		stats, customers = self.rollup_stats(sales_person, store, start, end, plan)
+
+		results = engine.Results(stats)
+		results.customers = customers # Transactions don't span days, so each day's customers are distinct
+		return results
+
+	def sales_people(self, store=None, start=None, end=None):
+		condition, params = self.where(None, store, start, end)
+		return [row[0] for row in self.db.execute(f'SELECT DISTINCT sales_person FROM pages WHERE {condition} ORDER BY sales_person', params)]
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Keep ingested Sales Lookup pages in a database and report on any period')
+	parser.add_argument('--db', default=STORE_PATH, help=f'database file (default: {STORE_PATH})')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	add = commands.add_parser('add', help='ingest saved pages')
+	add.add_argument('paths', nargs='+', help='page files, directories or globs')
+
+	report = commands.add_parser('report', help='commission per associate over a period, from the daily rollups')
+	report.add_argument('--person', help='only this sales person')
+	report.add_argument('--store', help='only this store, e.g. "101 - tustin"')
+	report.add_argument('--from', dest='start', help='first day, e.g. 2/1/2021')
+	report.add_argument('--to', dest='end', help='last day, inclusive')
+	report.add_argument('-p', '--plan', action='append', dest='plans', help='commission plan name or file, may be repeated (default: gsa)')
+	args = parser.parse_args(argv)
+
+	load_cache()
+	with SalesStore(args.db) as store:
+		if args.command == 'add':
+			pages = find_pages(args.paths)
+			if not pages: parser.error('no pages found')
+
+			added = sum(store.add_file(page) for page in pages)
+			print(f'{added} new rows from {len(pages)} pages, {len(store)} stored', file=sys.stderr)
+			save_cache()
+			return
+
+		people = [args.person] if args.person else store.sales_people(args.store, args.start, args.end)
+		writer = csv.DictWriter(sys.stdout, fieldnames=('sales_person', 'plan') + RESULT_FIELDS)
+		writer.writeheader()
+		for person in people:
+			for plan in args.plans or (None,):
+				results = store.report(person, args.store, args.start, args.end, plan)
+				row = {'sales_person': person, 'plan': engine.load_plan(plan).name}
+				row.update((field, getattr(results, field)) for field in RESULT_FIELDS)
+				writer.writerow(row)
+
+	save_cache() # Rollups worked out for the first time classify rows too
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,200 @@
+'''Synthetic Sales Lookup pages at any scale
+
+Usage: python synth.py [-n ROWS] [-p PEOPLE] [-s SEED] [--html] OUTPUT
+
+Pages look like the ones saved from the browser: the details block, the summary
+block, the 'Total: $' line and up to 100 rows per page, with a mix of sales,
+exchanges (paired legs) and returns, service plans and comma-formatted amounts.
+Output is deterministic for a given seed and generated a day at a time, so it
+can be streamed for row counts far beyond what fits in memory. With --html,
+OUTPUT is a directory and every page is written to it as a saved HTML page.
+'''
+from datetime import date, timedelta
+from html import escape
+import argparse
+import os
+import random
+
+from money import format_cents
+
+ROWS_PER_PAGE = 100
+STORE = '101 - Tustin'
+
+SERVICE_PLANS = (
+	('024364', '2 Year Replacement Plan', 1999),
+	('024125', '2 Year Replacement Plan', 699),
+	('023689', '2 Year Replacement Plan', 199),
+	('024158', '2 Year Replacement Plan', 999),
+	('026419', '2 Year Protection Plan', 9999),
+	('793760', '1 Year Accidental Damage Protection Plan', 3999),
+)
+PRODUCT_NOUNS = ('Gaming Mouse', 'Mechanical Keyboard', 'HDMI Cable 6 ft.', 'Wireless Router', 'Power Supply', 'Graphics Card',
+		'Solid State Drive', 'Motherboard', 'Gaming Headset', 'USB Flash Drive', 'Surge Protector', 'Network Cable 7 ft.',
+		'Processor', 'Monitor', 'Webcam', 'Mouse Pad', 'Ink Cartridge', '3D Printer Filament - 1kg Spool')
+PRODUCT_ADJECTIVES = ('RGB', 'Wireless', 'Pro', 'Ultra', 'Compact', 'Black', 'White', 'Refurbished', 'Dual-Band', 'Elite')
+SUMMARY_LINES = ('Computers Sold', 'Service Plans Sold', 'ESET Sold', 'Office Sold', 'Monitors', 'Nord VPN')
+COLUMNS = ('Transaction Number', 'Sale Type', 'Line', 'Sku', 'Description', 'Qty', 'Unit Price', 'Total')
+
+
+def make_catalog(rng, n_products=500):
+	'''Regular products as (sku, description, unit price in cents), prices spread from cents to thousands of dollars'''
+	catalog = []
+	for _ in range(n_products):
+		description = f'{rng.choice(PRODUCT_ADJECTIVES)} {rng.choice(PRODUCT_NOUNS)}'
+		price = int(10 ** rng.uniform(2, 5.3)) // 100 * 100 + 99 # $1.99 to ~$2,000.99
+		catalog.append((f'{rng.randrange(1000000):06d}', description, price))
+
+	return catalog
+
+def make_transaction(rng, catalog, number):
+	'''Rows of one transaction as (number, sale type, line, sku, description, qty, unit price, total)'''
+	roll = rng.random()
+	rows = []
+
+	if roll < .85:
+		number = f'101-PO-{number:08d}'
+		for _ in range(rng.randint(1, 5)):
+			sku, description, price = rng.choice(catalog)
+			qty = 1 if rng.random() < .9 else rng.randint(2, 4)
+			rows.append((number, 'Sale', len(rows) + 1, sku, description, qty, price, price * qty))
+
+			if rng.random() < .15:
+				sku, description, price = rng.choice(SERVICE_PLANS)
+				rows.append((number, 'Sale', len(rows) + 1, sku, description, 1, price, price))
+	elif roll < .95:
+		# Exchanges come as a returned leg and a replacement leg sharing a line number
+		number = f'101-RE-{number:08d}'
+		for line in range(1, rng.randint(1, 2) + 1):
+			for qty, source in ((-1, catalog), (1, catalog if rng.random() < .8 else SERVICE_PLANS)):
+				sku, description, price = rng.choice(source)
+				rows.append((number, 'Exchange', line, sku, description, qty, price * qty, price * qty))
+	else:
+		number = f'101-RE-{number:08d}'
+		for line in range(1, rng.randint(1, 2) + 1):
+			sku, description, price = rng.choice(catalog)
+			qty = -1 if rng.random() < .8 else -2
+			rows.append((number, 'Return', line, sku, description, qty, price * qty, price * qty))
+
+	return rows
+
+def page_lines(sales_person, day, total, rows, page_number, n_pages):
+	date_text = f'{day.month}/{day.day}/{day.year}'
+
+	yield 'Order History logoOrder History'
+	yield f'{sales_person} [ Log off ]'
+	yield f'Sales Lookup - {date_text}'
+	yield from ('Date', date_text, 'Store', STORE, 'Sales Person', sales_person, 'Cashier/CSR', ' ')
+	yield f'Details assigned to {sales_person} on {date_text}'
+	yield from (' ', 'Units', 'Revenue', 'Attach %', 'ASP', 'Revenue Per Unit')
+	yield f'Customers Served: {len({row[0] for row in rows})}\t \t{format_cents(total)}\t \t \t$0.00'
+	for summary in SUMMARY_LINES: yield f'{summary}\t0\t$0.00\t0.00 %\t$0.00\t$0.00'
+	yield from COLUMNS
+	yield ' \t \t \t \t \t \t \tTotal: ' + format_cents(total)
+
+	for number, sale_type, line, sku, description, qty, price, row_total in rows:
+		yield f'{number}\t{sale_type}\t{line}\t{sku}\t{description}\t{qty}\t{format_cents(price)}\t{format_cents(row_total)}'
+
+	yield from (str(page) for page in range(1, n_pages + 1))
+	yield from (str(ROWS_PER_PAGE), 'items per page', '©2021 Micro Electronics, Inc.')
+	if page_number < n_pages: yield from ('', 'NEXT PAGE', '')
+
+def generate_pages(n_rows, sales_people=('esexton',), seed=0, start=date(2021, 2, 1)):
+	'''Yields (sales person, day, day total, rows, page number, page count) for n_rows worth of pages
+
+	Each sales person gets one day of 20-250 rows in turn, split into pages of
+	ROWS_PER_PAGE. Only one day's rows are held at a time.
+	'''
+	rng = random.Random(seed)
+	catalog = make_catalog(rng)
+	number = 11000000
+	day = start
+	emitted = 0
+
+	while emitted < n_rows:
+		for sales_person in sales_people:
+			target = min(rng.randint(20, 250), n_rows - emitted)
+			if target <= 0: break
+
+			rows = []
+			while len(rows) < target:
+				number += 1
+				rows.extend(make_transaction(rng, catalog, number))
+			rows = rows[:target]
+			emitted += target
+
+			total = sum(row[-1] for row in rows)
+			n_pages = (len(rows) + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE
+			for page in range(n_pages):
+				yield sales_person, day, total, rows[page*ROWS_PER_PAGE:(page+1)*ROWS_PER_PAGE], page + 1, n_pages
+
+		day += timedelta(days=1)
+
+def generate_lines(n_rows, sales_people=('esexton',), seed=0, start=date(2021, 2, 1)):
+	'''Yields the lines of n_rows worth of pages, without line endings'''
+	for page in generate_pages(n_rows, sales_people, seed, start): yield from page_lines(*page)
+
+def page_html(sales_person, day, total, rows, page_number, n_pages):
+	'''The page as the browser saves it, with the same content as page_lines'''
+	date_text = f'{day.month}/{day.day}/{day.year}'
+	cells = lambda values, tag='td': ''.join(f'<{tag}>{escape(str(value))}</{tag}>' for value in values)
+
+	parts = [
+		'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Order History</title>',
+		'<style>td { padding: 2px; }</style><script>var page = "Sales Lookup";</script></head><body>',
+		f'<div class="logo"><img alt="Order History logo">Order History</div><div>{sales_person} <a href="#">[ Log off ]</a></div>',
+		f'<h2>Sales Lookup - {date_text}</h2>',
+		'<table class="details">',
+		f'<tr><td>Date</td><td>{date_text}</td></tr><tr><td>Store</td><td>{STORE}</td></tr>',
+		f'<tr><td>Sales Person</td><td>{sales_person}</td></tr><tr><td>Cashier/CSR</td><td>&nbsp;</td></tr>',
+		'</table>',
+		f'<h3>Details assigned to {sales_person} on {date_text}</h3>',
+		'<table class="summary"><tr><th>&nbsp;</th>' + cells(('Units', 'Revenue', 'Attach %', 'ASP', 'Revenue Per Unit'), 'th') + '</tr>',
+		f'<tr><td>Customers Served: {len({row[0] for row in rows})}</td><td>&nbsp;</td><td>{format_cents(total)}</td><td>&nbsp;</td><td>&nbsp;</td><td>$0.00</td></tr>',
+	]
+	parts.extend(f'<tr>{cells((summary, 0, "$0.00", "0.00 %", "$0.00", "$0.00"))}</tr>' for summary in SUMMARY_LINES)
+	parts.append('</table>')
+
+	parts.append('<table class="transactions"><thead><tr>' + cells(COLUMNS, 'th') + '</tr>')
+	parts.append(f'<tr><td colspan="7">&nbsp;</td><td>Total: {format_cents(total)}</td></tr></thead><tbody>')
+	for number, sale_type, line, sku, description, qty, price, row_total in rows:
+		parts.append(f'<tr><td><a href="/receipt/{number}">{number}</a></td>' + cells((sale_type, line, sku, description, qty, format_cents(price), format_cents(row_total))) + '</tr>')
+	parts.append('</tbody></table>')
+
+	parts.append('<div class="pager">' + ' '.join(f'<a href="#">{page}</a>' for page in range(1, n_pages + 1)) + f' {ROWS_PER_PAGE} items per page</div>')
+	parts.append('<footer>&copy;2021 Micro Electronics, Inc.</footer></body></html>\n')
+
+	return '\n'.join(parts)
+
+def write_html_pages(directory, n_rows, sales_people=('esexton',), seed=0):
+	'''Writes every page to directory as its own HTML file'''
+	os.makedirs(directory, exist_ok=True)
+
+	for i, page in enumerate(generate_pages(n_rows, sales_people, seed)):
+		sales_person, day = page[:2]
+		with open(os.path.join(directory, f'{i:06d}-{sales_person}-{day.isoformat()}.html'), 'w', encoding='utf-8') as f:
+			f.write(page_html(*page))
+
+def generate_text(n_rows, sales_people=('esexton',), seed=0):
+	return '\n'.join(generate_lines(n_rows, sales_people, seed))
+
+def write_file(path, n_rows, sales_people=('esexton',), seed=0):
+	with open(path, 'w', encoding='utf-8', newline='\r\n') as f:
+		for line in generate_lines(n_rows, sales_people, seed): f.write(line + '\n')
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Write synthetic Sales Lookup pages')
+	parser.add_argument('output', help='file to write')
+	parser.add_argument('-n', '--rows', type=int, default=1000, help='number of transaction rows (default: 1000)')
+	parser.add_argument('-p', '--people', type=int, default=1, help='number of sales people (default: 1)')
+	parser.add_argument('-s', '--seed', type=int, default=0)
+	parser.add_argument('--html', action='store_true', help='write each page as HTML into the OUTPUT directory')
+	args = parser.parse_args(argv)
+
+	sales_people = [f'associate{i:03d}' for i in range(args.people)]
+	if args.html:
+		write_html_pages(args.output, args.rows, sales_people, args.seed)
+	else:
+		write_file(args.output, args.rows, sales_people, args.seed)
+
+if __name__ == '__main__':
+	main()
@@ -1,7 +1,13 @@
 import tkinter as tk
 
 class Table:
-	'''Creates a table for Tkinter using labels'''
+	'''Creates a table for Tkinter using labels
+
+	Every write to a label is a round trip to Tcl, so the table keeps a shadow
+	copy of each cell's text and colours and only configures labels whose
+	values actually changed. update() queues many cell changes and applies
+	them together in one idle callback.
+	'''
 
 	def __init__(self, master, nrows, ncols, colwidth, padx=2, pady=2):
 		self.master = master
@@ -11,6 +17,10 @@ class Table:
 
 		self.tbl = tk.Frame(master=master)
 		self.labels = []
+		self.values = [[''] * ncols for _ in range(nrows)] # Text currently shown in each label
+		self.colours = [[None] * ncols for _ in range(nrows)] # (fg, bg) currently set on each label
+		self.pending = {} # (r,c) to text waiting for the next flush
+		self.flush_id = None
 
 		for r in range(nrows):
 			row = []
@@ -31,32 +41,63 @@ class Table:
 		Outputs:
 		None
 		'''
-		if rc == 'row':
-			c = index[1]
-			for arg in args:
-				if c >= self.ncols: break
-
-				self.labels[index[0]][c]['text'] = arg
-				c += 1
-		elif rc == 'col':
-			r = index[0]
-			for arg in args:
-				if r >= self.nrows: break
-
-				self.labels[r][index[1]]['text'] = arg
-				r += 1
-		else: raise ValueError('rc must equal "row" or "col"')
+		for cell, arg in zip(self.cells(rc, index), args): self.set_cell(cell, arg)
+
+	def set_cell(self, cell, value):
+		'''Sets the text of the label at cell (r,c) right away, if it differs from what is shown'''
+		r, c = cell
+		value = str(value)
+		self.pending.pop(cell, None)
+
+		if self.values[r][c] != value:
+			self.values[r][c] = value
+			self.labels[r][c]['text'] = value
+
+	def get(self, cell):
+		'''Text of the label at cell (r,c), including changes still waiting to be flushed'''
+		r, c = cell
+		return self.pending.get(cell, self.values[r][c])
+
+	def update(self, changes):
+		'''Queues many cell changes to be applied together in one idle callback
+
+		Inputs:
+		changes -- dict of (r,c) to value, or an iterable of ((r,c), value) pairs
+
+		Outputs:
+		None
+		'''
+		if isinstance(changes, dict): changes = changes.items()
+
+		for cell, value in changes: self.pending[cell] = str(value)
+
+		if self.pending and self.flush_id is None: self.flush_id = self.tbl.after_idle(self.flush)
+
+	def flush(self):
+		'''Applies the queued changes now'''
+		if self.flush_id is not None:
+			self.tbl.after_cancel(self.flush_id)
+			self.flush_id = None
+
+		pending, self.pending = self.pending, {}
+		for cell, value in pending.items(): self.set_cell(cell, value)
+
+	def clear(self, index=(0,0)):
+		'''Empties every cell below and to the right of index (r,c)'''
+		self.update(((r, c), '') for r in range(index[0], self.nrows) for c in range(index[1], self.ncols))
+
+	def cells(self, rc, index):
+		'''(r,c) of each cell from index to the end of its row or col'''
+		if rc == 'row': return [(index[0], c) for c in range(index[1], self.ncols)]
+		if rc == 'col': return [(r, index[1]) for r in range(index[0], self.nrows)]
+
+		raise ValueError('rc must equal "row" or "col"')
 
 	def set_colours(self, rc, index, fg, bg):
-		if rc == 'row':
-			for c in range(index[1], self.ncols):
-				self.labels[index[0]][c].config(fg=fg)
-				self.labels[index[0]][c].config(bg=bg)
-		elif rc == 'col':
-			for r in range(index[0], self.nrows):
-				self.labels[r][index[1]].config(fg=fg)
-				self.labels[r][index[1]].config(bg=bg)
-		else: raise ValueError('rc must equal "row" or "col"')
+		for r, c in self.cells(rc, index):
+			if self.colours[r][c] != (fg, bg):
+				self.colours[r][c] = (fg, bg)
+				self.labels[r][c].config(fg=fg, bg=bg)
 
 	def pack(self):
 		self.tbl.pack()
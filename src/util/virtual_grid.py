@@ -0,0 +1,133 @@
+import tkinter as tk
+
+class VirtualGrid:
+	'''Scrollable, sortable and filterable grid for Tkinter that scales to any number of rows
+
+	Unlike Table, there is no widget per cell. The grid holds the rows as data
+	and draws only the rows that fit in view onto a Canvas, reusing the same
+	canvas text items as it scrolls, so the cost of a redraw depends on the
+	height of the window and not on how many rows there are.
+	'''
+
+	def __init__(self, master, columns, colwidths, height=20, row_height=20, font='TkFixedFont'):
+		'''
+		Inputs:
+		master -- parent widget
+		columns -- column headings
+		colwidths -- width of each column in pixels
+		height -- number of rows to show
+		row_height -- height of a row in pixels
+		'''
+		self.columns = columns
+		self.row_height = row_height
+		self.font = font
+		self.x = [sum(colwidths[:c]) for c in range(len(colwidths))]
+
+		self.rows = [] # Every row as a tuple of cell values
+		self.view = [] # Indexes into rows that pass the filter, in display order
+		self.formatters = [str] * len(columns)
+		self.search_text = None # Lowercased text of each row, built the first time a filter needs it
+		self.sort_column = None
+		self.sort_reverse = False
+		self.filter_text = ''
+		self.top = 0 # Index into view of the first row shown
+		self.items = [] # Canvas text items per shown row, reused as the view scrolls
+
+		self.frame = tk.Frame(master=master)
+		header = tk.Frame(master=self.frame)
+		for c, (column, width) in enumerate(zip(columns, colwidths)):
+			tk.Button(text=column, master=header, anchor='w', command=lambda c=c: self.sort(c)).place(x=self.x[c], y=0, width=width)
+		header.config(width=sum(colwidths), height=row_height + 6)
+
+		self.canvas = tk.Canvas(master=self.frame, width=sum(colwidths), height=height * row_height, background='white', highlightthickness=0)
+		self.scrollbar = tk.Scrollbar(master=self.frame, orient=tk.VERTICAL, command=self.yview)
+
+		header.grid(row=0, column=0, sticky='w')
+		self.canvas.grid(row=1, column=0, sticky='nsew')
+		self.scrollbar.grid(row=1, column=1, sticky='ns')
+		self.frame.rowconfigure(1, weight=1)
+		self.frame.columnconfigure(0, weight=1)
+
+		self.canvas.bind('<Configure>', lambda ev: self.redraw())
+		self.canvas.bind('<MouseWheel>', lambda ev: self.scroll(-1 if ev.delta > 0 else 1, 'units'))
+		self.canvas.bind('<Button-4>', lambda ev: self.scroll(-1, 'units'))
+		self.canvas.bind('<Button-5>', lambda ev: self.scroll(1, 'units'))
+
+	def set_rows(self, rows, formatters=None):
+		'''Replaces the data
+
+		Inputs:
+		rows -- list of tuples, one value per column. Values are what sorting compares
+		formatters -- optional function per column turning a value into the text shown
+		'''
+		self.rows = rows
+		if formatters is not None: self.formatters = formatters
+		self.search_text = None
+		self.refresh_view()
+
+	def sort(self, column):
+		'''Sorts by column, clicking the same column again reverses the order'''
+		self.sort_reverse = not self.sort_reverse if self.sort_column == column else False
+		self.sort_column = column
+		self.refresh_view()
+
+	def filter(self, text):
+		'''Only shows rows containing text in any column, ignoring case'''
+		self.filter_text = text.strip().lower()
+		self.refresh_view()
+
+	def refresh_view(self):
+		if self.filter_text:
+			if self.search_text is None: self.search_text = ['\t'.join(self.format_row(row)).lower() for row in self.rows]
+			self.view = [i for i, text in enumerate(self.search_text) if self.filter_text in text]
+		else:
+			self.view = list(range(len(self.rows)))
+
+		if self.sort_column is not None:
+			rows, c = self.rows, self.sort_column
+			self.view.sort(key=lambda i: rows[i][c], reverse=self.sort_reverse)
+
+		self.top = 0
+		self.redraw()
+
+	def format_row(self, row):
+		return [format_value(value) for format_value, value in zip(self.formatters, row)]
+
+	def visible_count(self):
+		height = self.canvas.winfo_height()
+		return max(1, height // self.row_height + 1)
+
+	def yview(self, *args):
+		'''Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' or 'pages')'''
+		if args[0] == 'moveto':
+			self.scroll_to(int(float(args[1]) * len(self.view)))
+		elif args[0] == 'scroll':
+			self.scroll(int(args[1]), args[2])
+
+	def scroll(self, n, what):
+		self.scroll_to(self.top + n * (self.visible_count() - 1 if what == 'pages' else 1))
+
+	def scroll_to(self, top):
+		top = max(0, min(top, len(self.view) - self.visible_count() + 1))
+		if top != self.top:
+			self.top = top
+			self.redraw()
+
+	def redraw(self):
+		'''Draws the rows currently in view, creating canvas items only when the window has grown'''
+		n = self.visible_count()
+
+		while len(self.items) < n:
+			y = len(self.items) * self.row_height + 2
+			self.items.append([self.canvas.create_text(x + 4, y, anchor='nw', font=self.font) for x in self.x])
+
+		for r, items in enumerate(self.items):
+			v = self.top + r
+			cells = self.format_row(self.rows[self.view[v]]) if v < len(self.view) else [''] * len(items)
+			for item, text in zip(items, cells): self.canvas.itemconfigure(item, text=text)
+
+		total = len(self.view) or 1
+		self.scrollbar.set(self.top / total, min(1, (self.top + n) / total))
+
+	def pack(self, **kwargs):
+		self.frame.pack(**kwargs)
@@ -0,0 +1,201 @@
+'''Watch folder service that keeps totals current as pages are saved
+
+Usage: python watch.py [--db FILE] [-j WORKERS] [-p PLAN]... [--status FILE] [--today DATE] DIRECTORY
+
+Exported pages dropped into DIRECTORY during the day are picked up by an
+asyncio loop that polls the folder. A file is only read once its size and
+modification time have stayed the same for SETTLE_TIME, so pages still being
+written are left alone. Settled files are parsed in a process pool and their
+rows added to the sales store, which refreshes the daily rollups of just the
+days they touch. Today's results per associate are kept in memory and, with
+--status, written out as JSON after every ingest.
+
+The stdlib has no portable file notifications, so the folder is polled; with
+the defaults a page shows up in the totals well under a second after it stops
+changing.
+'''
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import engine
+from batch import RESULT_FIELDS, find_pages
+from products import load_cache, save_cache
+from store import STORE_PATH, SalesStore, header_values, iso_date
+
+POLL_INTERVAL = 0.1 # Seconds between looks at the folder
+SETTLE_TIME = 0.3 # Seconds a file's size and mtime must stay put before it is read
+
+
+def read_pages(path):
+	'''Worker: the parsed pages of the file at path'''
+	with open(path, encoding='utf-8', errors='replace') as f:
+		return list(engine.iter_file_pages(path, f))
+
+
+class Watcher:
+	def __init__(self, directory, store, workers=None, poll=POLL_INTERVAL, settle=SETTLE_TIME, status_path=None, today=None):
+		'''
+		Inputs:
+		directory -- folder to watch for saved pages
+		store -- SalesStore to add them to, its plans are the ones reported on
+		workers -- worker processes parsing pages (default: one per core)
+		status_path -- optional JSON file rewritten with today's results after every ingest
+		today -- day whose results are kept in memory, a date or 'm/d/yyyy' (default: the actual date)
+		'''
+		self.directory = directory
+		self.store = store
+		self.workers = workers
+		self.poll = poll
+		self.settle = settle
+		self.status_path = status_path
+		self.fixed_today = iso_date(today)
+
+		self.ingested = {} # Path to the (size, mtime_ns) it had when it was read
+		self.changing = {} # Path to (size, mtime_ns, when it was first seen like that)
+		self.busy = set() # Paths being ingested right now
+		self.results = {} # (sales person, plan name) to today's engine.Results
+
+	@property
+	def today(self):
+		return self.fixed_today or date.today().isoformat()
+
+	def scan(self):
+		'''Paths of the pages in the folder that are new or changed and have settled'''
+		now = time.monotonic()
+		ready = []
+		present = set()
+
+		for path in find_pages([self.directory]):
+			present.add(path)
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue # Removed since it was listed
+
+			signature = stat.st_size, stat.st_mtime_ns
+			if path in self.busy or self.ingested.get(path) == signature: continue
+
+			changing = self.changing.get(path)
+			if changing is None or changing[:2] != signature:
+				self.changing[path] = signature + (now,)
+			elif now - changing[2] >= self.settle:
+				del self.changing[path]
+				ready.append((path, signature))
+
+		for path in set(self.changing) - present: del self.changing[path]
+
+		return ready
+
+	async def ingest(self, pool, path, signature):
+		'''Reads the file at path in pool and adds its pages to the store
+
+		The file only counts as ingested once its rows are stored, so if the
+		store write fails (e.g. the database is locked) it is read again on a
+		later scan. Files that can't be read are left until they change.
+		'''
+		self.busy.add(path)
+		try:
+			try:
+				pages = await asyncio.get_running_loop().run_in_executor(pool, read_pages, path)
+			except Exception as e:
+				print(f'{path}: {e!r}', file=sys.stderr)
+				self.ingested[path] = signature
+				return
+
+			# SQLite is only touched from the loop's thread, these writes and the rollups read back take milliseconds
+			added = self.store.add_pages(pages)
+			self.ingested[path] = signature
+		finally:
+			self.busy.discard(path)
+
+		people = {person for day, _, person in map(header_values, (page.header for page in pages)) if day == self.today}
+		self.refresh(people)
+
+		latency = time.time() - signature[1] / 1e9
+		print(f'{path}: {added} new rows, totals current {latency:.2f}s after it was saved', file=sys.stderr)
+
+	def refresh(self, people):
+		'''Works out today's results again for people, from the rollups'''
+		for person in people:
+			for plan in self.store.plans:
+				self.results[person, plan.name] = self.store.report(person, None, self.today, self.today, plan)
+
+		if people and self.status_path: self.write_status()
+
+	@staticmethod
+	def ingest_done(task):
+		'''Done callback of ingest tasks, logs what went wrong, they are named after their path'''
+		if not task.cancelled() and task.exception() is not None:
+			print(f'{task.get_name()}: not ingested, {task.exception()!r}', file=sys.stderr)
+
+	def status(self):
+		'''Today's results as a list of dicts, one per associate and plan'''
+		rows = []
+		for (person, plan_name), results in sorted(self.results.items()):
+			row = {'sales_person': person, 'plan': plan_name, 'date': self.today}
+			row.update((field, getattr(results, field)) for field in RESULT_FIELDS)
+			rows.append(row)
+
+		return rows
+
+	def write_status(self):
+		# Swapped in whole so readers never see a half written file
+		tmp = f'{self.status_path}.tmp'
+		with open(tmp, 'w') as f: json.dump(self.status(), f, indent=2)
+		os.replace(tmp, self.status_path)
+
+	async def run(self, stop=None):
+		'''Watches until stop (an asyncio.Event) is set, or forever'''
+		today = self.today
+		self.refresh(self.store.sales_people(start=today, end=today)) # Pick up where the last run left off
+
+		tasks = set()
+		with ProcessPoolExecutor(max_workers=self.workers) as pool:
+			while stop is None or not stop.is_set():
+				if self.today != today:
+					# New day, yesterday's results are in the store
+					today = self.today
+					self.results.clear()
+
+				for path, signature in self.scan():
+					task = asyncio.create_task(self.ingest(pool, path, signature), name=path)
+					tasks.add(task)
+					task.add_done_callback(tasks.discard)
+					task.add_done_callback(self.ingest_done)
+
+				await asyncio.sleep(self.poll)
+
+			if tasks: await asyncio.gather(*tasks, return_exceptions=True) # Already logged by ingest_done
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Watch a folder for saved Sales Lookup pages and keep totals current')
+	parser.add_argument('directory', help='folder pages are saved into')
+	parser.add_argument('--db', default=STORE_PATH, help=f'database file (default: {STORE_PATH})')
+	parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per core)')
+	parser.add_argument('-p', '--plan', action='append', dest='plans', help='commission plan name or file, may be repeated (default: gsa)')
+	parser.add_argument('--status', metavar='FILE', help="write today's results per associate to FILE as JSON after every ingest")
+	parser.add_argument('--today', help='day to keep results for, e.g. 2/15/2021 (default: the actual date)')
+	parser.add_argument('--poll', type=float, default=POLL_INTERVAL, help=f'seconds between scans (default: {POLL_INTERVAL})')
+	parser.add_argument('--settle', type=float, default=SETTLE_TIME, help=f'seconds a file must stay unchanged (default: {SETTLE_TIME})')
+	args = parser.parse_args(argv)
+
+	if not os.path.isdir(args.directory): parser.error(f'not a directory: {args.directory}')
+
+	load_cache() # Rows are added in this process, the workers only parse
+	with SalesStore(args.db, args.plans or (None,)) as store:
+		watcher = Watcher(args.directory, store, args.workers, args.poll, args.settle, args.status, args.today)
+		try:
+			asyncio.run(watcher.run())
+		except KeyboardInterrupt:
+			pass
+		finally:
+			save_cache()
+
+if __name__ == '__main__':
+	main()
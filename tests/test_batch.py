@@ -0,0 +1,40 @@
+import os
+import shutil
+
+import pytest
+
+import batch
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+
+
+@pytest.fixture
+def pages(tmp_path):
+	'''Every test file, plus testfile1.txt saved twice more'''
+	for name in os.listdir(TESTFILES): shutil.copy(os.path.join(TESTFILES, name), tmp_path / name)
+	shutil.copy(tmp_path / 'testfile1.txt', tmp_path / 'copy1.txt')
+	shutil.copy(tmp_path / 'testfile1.txt', tmp_path / 'zcopy1.txt')
+
+	return batch.find_pages([str(tmp_path)])
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_merge_counts_saved_twice_once(pages, workers):
+	stats = batch.run_merged(pages, workers, ('gsa',))['GSA']
+	alone = batch.run_merged([page for page in pages if 'copy' not in page], 1, ('gsa',))['GSA']
+
+	assert stats.bucket_totals == alone.bucket_totals
+	assert stats.returns_count == alone.returns_count
+	assert stats.seen_custs == alone.seen_custs
+
+def test_split_pages_keeps_copies_together(pages):
+	for part in batch.split_pages(pages, len(pages)):
+		copies = [page for page in part if page.endswith(('copy1.txt', 'testfile1.txt'))]
+		assert not copies or len(copies) == 3
+
+def test_totals_leave_out_customers(pages):
+	rows = batch.run(pages, 1, ('gsa',))
+	total, = batch.aggregate(rows)
+
+	assert 'customers' not in total
+	assert total['returns_count'] == sum(row['returns_count'] for row in rows)
+	assert total['commission'] == pytest.approx(sum(row['commission'] for row in rows))
@@ -0,0 +1,38 @@
+import pytest
+
+from catalog import Catalog, write_index
+
+
+@pytest.fixture
+def index(tmp_path):
+	'''Writes the (sku, department) pairs given as an index file and maps it'''
+	opened = []
+
+	def build(pairs):
+		path = str(tmp_path / 'catalog.idx')
+		write_index(Catalog.from_pairs(pairs), path)
+		opened.append(Catalog.open(path))
+		return opened[-1]
+
+	yield build
+	for catalog in opened: catalog.close()
+
+def test_leading_zeros_stay_distinct(index):
+	catalog = index([('024364', 'GSA'), ('24364', 'BYO'), ('196071', 'byo')])
+
+	assert len(catalog) == 3
+	assert catalog.department('024364') == 'gsa'
+	assert catalog.department('24364') == 'byo'
+	assert catalog.department('196071') == 'byo'
+	assert catalog.department('0024364') is None
+	assert catalog.department('not a sku') is None
+
+def test_empty_index(index):
+	catalog = index([])
+
+	assert len(catalog) == 0
+	assert catalog.department('024364') is None
+
+def test_non_numeric_sku():
+	with pytest.raises(ValueError):
+		Catalog.from_pairs([('abc', 'gsa')])
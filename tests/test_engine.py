@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import engine
+from catalog import Catalog
+from sales_lookup import LineItem, iter_pages
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+
+# GSA results per test file: commission, returns count, returns total, customers
+EXPECTED = {
+	'planexamples.txt': (215.94075, 2, 79.99, 46),
+	'testfile1.txt': (72.41105, 3, 59.97, 42),
+	'testfile2.txt': (148.9058, 4, 170.98, 71),
+	'testfile3.txt': (203.8469, 5, 364.93, 35),
+	'testsalesctrla.txt': (72.71445, 1, 19.99, 30),
+}
+
+# Both routers in the exchange in planexamples.txt, and the one sold in testfile1.txt and testfile2.txt
+ROUTERS = Catalog.from_pairs([('196071', 'byo'), ('872689', 'byo')])
+
+
+def read_lines(name):
+	with open(os.path.join(TESTFILES, name), encoding='utf-8') as f:
+		return f.read().split('\n')
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_testfiles(name):
+	results = engine.process_lines_plans(read_lines(name), ('gsa',))['GSA']
+
+	commission, returns_count, returns_total, customers = EXPECTED[name]
+	assert results.commission == pytest.approx(commission)
+	assert results.returns_count == returns_count
+	assert results.returns_total == pytest.approx(returns_total)
+	assert results.customers == customers
+
+def test_exchange_refund_counts_returned_units():
+	# testfile1.txt has three exchanges that only refund, one unit each
+	stats = engine.stats_pages_plans(iter_pages(read_lines('testfile1.txt')), ('gsa',))[0]
+	exchanges = [key for key, (net, _) in stats.leg_nets.items() if net < 0]
+
+	assert len(exchanges) == 3
+	assert stats.returns_count == 3
+
+@pytest.mark.parametrize('name, out_of_dept_total, commission', [
+	('planexamples.txt', 129.99, 215.8905), # The new router of the exchange, the refunded one is a return
+	('testfile1.txt', 89.99, 70.61125),
+	('testfile2.txt', 269.97, 143.5064),
+])
+def test_catalog_out_of_dept(name, out_of_dept_total, commission):
+	results = engine.process_lines_plans(read_lines(name), ('gsa',), catalog=ROUTERS)['GSA']
+
+	assert results.out_of_dept_total == pytest.approx(out_of_dept_total)
+	assert results.commission == pytest.approx(commission)
+
+def test_explain_netted_leg_out_of_dept():
+	items = [item for page in iter_pages(read_lines('planexamples.txt')) for item in page.items]
+	router = next(item for item in items if item.sku == '872689')
+
+	category, _, commission = engine.explain_row(router, 'gsa', ROUTERS)
+	assert category == engine.OUT_OF_DEPT
+	assert commission == pytest.approx(router.total * 0.01)
+
+def split_merge(items, deductions=(), catalog=ROUTERS):
+	'''(serial stats, stats of every other row on each side merged) for items under gsa'''
+	serial = engine.PersonalStats('gsa', catalog)
+	engine.calc_commission(items, deductions, serial)
+
+	left, right = engine.PersonalStats('gsa', catalog), engine.PersonalStats('gsa', catalog)
+	engine.calc_commission(items[::2], deductions, left)
+	engine.calc_commission(items[1::2], deductions, right)
+
+	return serial, left + right
+
+def test_merge_matches_serial():
+	items = [item for page in iter_pages(read_lines('planexamples.txt')) for item in page.items]
+	serial, merged = split_merge(items)
+
+	assert engine.Results(merged).as_dict() == engine.Results(serial).as_dict()
+
+def test_merge_renets_out_of_dept_exchange():
+	# Both legs out of department and in the same bracket, one on each side
+	items = [
+		LineItem('101-re-1', 'exchange', 1, '196071', 'router', -1, -5000, -5000),
+		LineItem('101-re-1', 'exchange', 2, '872689', 'router', 1, 6000, 6000),
+	]
+	serial, merged = split_merge(items)
+	results = engine.Results(merged)
+
+	assert results.as_dict() == engine.Results(serial).as_dict()
+	assert results.out_of_dept_total == pytest.approx(10)
+	assert results.commission == pytest.approx(0.10)
+
+def test_merge_counts_typed_deductions_once():
+	items = [item for page in iter_pages(read_lines('testfile1.txt')) for item in page.items]
+	serial, merged = split_merge(items, (0, 20, 0), None)
+
+	assert merged.typed_deductions == [0, 2000, 0]
+	assert engine.Results(merged).as_dict() == engine.Results(serial).as_dict()
+
+	other = engine.PersonalStats('gsa')
+	engine.apply_deductions((0, 5, 0), other)
+	with pytest.raises(ValueError):
+		merged.merge(other)
+
+def test_merge_refuses_shared_rows():
+	items = [item for page in iter_pages(read_lines('testfile1.txt')) for item in page.items]
+	serial, merged = split_merge(items)
+
+	with pytest.raises(engine.SharedRowsError):
+		merged.merge(serial)
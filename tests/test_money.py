@@ -0,0 +1,25 @@
+import pytest
+
+from money import format_cents, parse_cents, to_cents
+
+
+@pytest.mark.parametrize('text, cents', [
+	('$1,234.56', 123456),
+	('($1,234.56)', -123456),
+	('-$5', -500),
+	('$.5', 50),
+	('$0.00', 0),
+	('1234.5', 123450),
+	('(-$5.00)', 500),
+])
+def test_parse_cents(text, cents):
+	assert parse_cents(text) == cents
+	assert parse_cents(text) == cents # Second time from the cache
+
+@pytest.mark.parametrize('value, cents', [('', 0), (' $19.99 ', 1999), (19.99, 1999), (10, 1000), (0.1 + 0.2, 30)])
+def test_to_cents(value, cents):
+	assert to_cents(value) == cents
+
+@pytest.mark.parametrize('cents', [0, 5, 1999, 123456, -2999, -123456789])
+def test_format_round_trip(cents):
+	assert parse_cents(format_cents(cents)) == cents
@@ -0,0 +1,38 @@
+import pytest
+
+from plan import LOOKUP_LIMIT, Plan, load_plan
+
+SALE = {'sale': {'bracket_by': 'unit_price', 'into': 'sales'}}
+
+
+def make_plan(*bounds):
+	return Plan('test', [{'from': bound, 'rate': 0.01 * (i + 1)} for i, bound in enumerate(bounds)], 0.01, 0.1, SALE)
+
+@pytest.mark.parametrize('cents, bucket', [(0, 0), (999, 0), (1000, 1), (9999, 1), (10000, 2), (LOOKUP_LIMIT, 2), (10**9, 2)])
+def test_gsa_bucket_boundaries(cents, bucket):
+	assert load_plan('gsa').bucket(cents) == bucket
+
+def test_bounds_past_lookup_limit():
+	# Brackets at $0, $500 and $1000: the lookup table stops at LOOKUP_LIMIT and bisect takes over
+	plan = make_plan(0, 500, 1000)
+	assert LOOKUP_LIMIT < 100000
+
+	for cents, bucket in [(49999, 0), (50000, 1), (LOOKUP_LIMIT - 1, 1), (LOOKUP_LIMIT, 1), (99999, 1), (100000, 2)]:
+		assert plan.bucket(cents) == bucket
+
+def test_bucket_matches_bisect_everywhere():
+	plan = make_plan(0, 0.01, 10, 655.35, 655.36, 700)
+	for cents in list(range(0, LOOKUP_LIMIT + 5000, 7)) + [65534, 65535, 65536, 65537, 69999, 70000]:
+		assert plan.bucket(cents) == sum(bound <= cents for bound in plan.bounds) - 1
+
+def test_negative_price():
+	with pytest.raises(ValueError):
+		load_plan('gsa').bucket(-1)
+
+@pytest.mark.parametrize('bounds', [(10, 100), (0, 100, 10), (0, 10, 10)])
+def test_bad_brackets(bounds):
+	with pytest.raises(ValueError):
+		make_plan(*bounds)
+
+def test_ranges():
+	assert load_plan('gsa').ranges[:2] == ((0, 9.99), (10, 99.99))
@@ -0,0 +1,32 @@
+import threading
+
+from products import REGULAR, SERVICE_PLAN, ProductCache
+
+
+def test_lookup_waits_for_the_lock():
+	# The GUI's worker thread and main thread share the cache, a lookup mustn't run while another thread changes it
+	cache = ProductCache(size=1)
+	cache.category('024364', '2 year replacement plan')
+	found = []
+
+	with cache.lock:
+		thread = threading.Thread(target=lambda: found.append(cache.category('024364', '2 year replacement plan')))
+		thread.start()
+		thread.join(0.1)
+		assert thread.is_alive()
+		cache.categories.clear() # As if the other thread evicted it
+
+	thread.join()
+	assert found == [SERVICE_PLAN]
+	assert len(cache) == 1
+
+def test_save_and_load(tmp_path):
+	path = str(tmp_path / 'products.json')
+	cache = ProductCache()
+	cache.category('024364', '2 year replacement plan')
+	cache.category('', 'hdmi cable')
+	cache.save(path)
+
+	loaded = ProductCache()
+	loaded.load(path)
+	assert list(loaded.categories.items()) == [('024364', SERVICE_PLAN), ('hdmi cable', REGULAR)]
@@ -0,0 +1,19 @@
+import os
+import shutil
+
+import pytest
+
+import report
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_page_saved_twice_counts_once(tmp_path, workers):
+	for name in ('testfile1.txt', 'testfile2.txt', 'testfile3.txt'): shutil.copy(os.path.join(TESTFILES, name), tmp_path / name)
+	alone = list(report.run(report.find_pages([str(tmp_path)]), 1, ('gsa',)).rows())
+
+	shutil.copy(tmp_path / 'testfile1.txt', tmp_path / 'copy1.txt')
+	rows = list(report.run(report.find_pages([str(tmp_path)]), workers, ('gsa',)).rows())
+
+	assert rows == alone
@@ -0,0 +1,45 @@
+from datetime import date
+import io
+import os
+
+import pytest
+
+import engine
+import synth
+from money import parse_cents
+from sales_lookup import iter_pages
+from sales_lookup_html import iter_html_pages
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+# A day with nothing but a return, so the total above the table is in brackets
+RETURN_DAY = ('esexton', date(2021, 2, 16), -2999, [('101-RE-11132924', 'Return', 1, '399436', 'Mini-HDMI 4x1 Switch', -1, -2999, -2999)], 1, 1)
+
+
+def test_two_page_headers():
+	with open(os.path.join(TESTFILES, 'testfile2.txt'), encoding='utf-8') as f:
+		text = f.read()
+	pages = list(iter_pages(text.split('\n')))
+
+	assert len(pages) == 2
+	first, second = (page.header for page in pages)
+	assert first is not second
+	for header in (first, second):
+		assert (header.date, header.store, header.sales_person) == ('2/5/2021', '101 - tustin', 'esexton')
+		assert header.total is not None
+
+	assert sum(len(page.items) for page in pages) == len(engine.parse_table(text))
+
+@pytest.mark.parametrize('pages', [
+	lambda: iter_pages(synth.page_lines(*RETURN_DAY)),
+	lambda: iter_html_pages([synth.page_html(*RETURN_DAY)]),
+], ids=['text', 'html'])
+def test_negative_day_total(pages):
+	page, = pages()
+
+	assert page.header.total == '($29.99)'
+	assert parse_cents(page.header.total) == -2999
+	assert [(item.sale_type, item.qty, item.total) for item in page.items] == [('return', -1, -2999)]
+
+def test_negative_day_reconciles():
+	assert engine.reconcile(synth.page_lines(*RETURN_DAY)) == []
+	assert engine.reconcile(io.StringIO('\n'.join(synth.page_lines(*RETURN_DAY)).replace('($29.99)\n', '($19.99)\n', 1))) != []
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import report
+import synth
+from plan import Plan, load_plan
+from simulate import RESULT_FIELDS, Simulation
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+
+THREE = {
+	'name': 'Three', 'out_of_dept_rate': 0.01, 'service_plan_rate': 0.12,
+	'brackets': [{'from': 0, 'rate': 0.05}, {'from': 25, 'rate': 0.025}, {'from': 250, 'rate': 0.01}],
+	'sale_types': {
+		'sale': {'bracket_by': 'unit_price', 'into': 'sales', 'service_plans': True},
+		'exchange': {'bracket_by': 'total', 'into': 'sales', 'net_legs': True},
+		'return': {'bracket_by': 'total', 'into': 'returns'},
+	},
+}
+# Four brackets, and exchange legs counted one row at a time rather than netted
+FOUR = {
+	'name': 'Four', 'out_of_dept_rate': 0.01, 'service_plan_rate': 0.08,
+	'brackets': [{'from': 0, 'rate': 0.07}, {'from': 5, 'rate': 0.04}, {'from': 50, 'rate': 0.02}, {'from': 500, 'rate': 0.005}],
+	'sale_types': {
+		'sale': {'bracket_by': 'unit_price', 'into': 'sales', 'service_plans': True},
+		'exchange': {'bracket_by': 'total', 'into': 'sales'},
+		'return': {'bracket_by': 'total', 'into': 'returns'},
+	},
+}
+
+
+@pytest.fixture
+def page_files(tmp_path):
+	'''The same synthetic pages saved as text and as HTML'''
+	pages = list(synth.generate_pages(300, ('associate000', 'associate001'), seed=3))
+	text, html = tmp_path / 'pages.txt', tmp_path / 'html'
+	html.mkdir()
+
+	text.write_text('\n'.join(line for page in pages for line in synth.page_lines(*page)), encoding='utf-8')
+	for i, page in enumerate(pages): (html / f'{i:03d}.html').write_text(synth.page_html(*page), encoding='utf-8')
+
+	return str(text), sorted(str(path) for path in html.iterdir())
+
+def test_html_matches_text(page_files):
+	text, html = page_files
+	from_text, from_html = Simulation(('gsa', 'byo')), Simulation(('gsa', 'byo'))
+	from_text.add_file(text)
+	for path in html: from_html.add_file(path)
+
+	rows = from_html.results()
+	assert len(rows) == 4
+	assert rows == from_text.results()
+
+
+def test_results_match_engine(tmp_path):
+	synth.write_file(str(tmp_path / 'synth.txt'), 3000, ('associate000', 'associate001'), seed=5)
+	paths = [os.path.join(TESTFILES, name) for name in sorted(os.listdir(TESTFILES))] + [str(tmp_path / 'synth.txt')]
+	plans = [load_plan('gsa'), load_plan('byo'), Plan.from_dict(THREE), Plan.from_dict(FOUR)]
+
+	simulation = Simulation(plans)
+	people = report.People(plans)
+	for path in paths:
+		simulation.add_file(path)
+		people.add_file(path)
+
+	expected = {(row['sales_person'], row['plan']): row for row in people.rows()}
+	rows = simulation.results()
+	assert len(rows) == len(expected) == 4 * 4
+
+	for row in rows:
+		engine_row = expected[row['sales_person'], row['plan']]
+		for field in RESULT_FIELDS: assert row[field] == pytest.approx(engine_row[field]), (row['sales_person'], row['plan'], field)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import engine
+from sales_lookup import LineItem, Page
+from store import SalesStore
+
+TESTFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testfiles')
+ESEXTON = ('testfile1.txt', 'testfile2.txt', 'testfile3.txt') # 2/15/2021, 2/5/2021 and 12/23/2020
+
+
+@pytest.fixture
+def store():
+	with SalesStore(':memory:', ('gsa',)) as store:
+		for name in ESEXTON + ('planexamples.txt',): store.add_file(os.path.join(TESTFILES, name))
+		yield store
+
+def test_ingest_twice_adds_nothing(store):
+	rows = len(store)
+	assert rows > 0
+
+	assert store.add_file(os.path.join(TESTFILES, 'testfile1.txt')) == 0
+	assert len(store) == rows
+
+def test_period_matches_engine(store):
+	results = store.results('esexton', None, '2/1/2021', '2021-02-28', 'gsa')
+
+	stats = engine.PersonalStats('gsa')
+	for name in ('testfile1.txt', 'testfile2.txt'): engine.process_file(os.path.join(TESTFILES, name), (), stats)
+
+	assert results.as_dict() == engine.Results(stats).as_dict()
+
+@pytest.mark.parametrize('person, start, end', [
+	('esexton', '2/1/2021', '2/28/2021'),
+	('esexton', None, None),
+	(None, '12/1/2020', '2/18/2021'),
+])
+def test_report_matches_results(store, person, start, end):
+	# report() only sums daily rollups, results() reads the line items
+	assert store.report(person, None, start, end, 'gsa').as_dict() == store.results(person, None, start, end, 'gsa').as_dict()
+
+def test_ingest_refreshes_only_its_day(store, monkeypatch):
+	with open(os.path.join(TESTFILES, 'testfile1.txt'), encoding='utf-8') as f:
+		header = next(engine.iter_file_pages('testfile1.txt', f)).header
+	before = store.report('esexton', None, '2/15/2021', '2/15/2021', 'gsa')
+
+	# Each day's rollup is worked out from store.stats over that day
+	refreshed = []
+	stats = store.stats
+	def spy(sales_person, *args):
+		refreshed.append((sales_person, args[1]))
+		return stats(sales_person, *args)
+	monkeypatch.setattr(store, 'stats', spy)
+
+	item = LineItem('101-po-99999999', 'sale', 1, '196071', 'router', 1, 8999, 8999)
+	assert store.add_pages([Page(header, [item])]) == 1
+	assert refreshed == [('esexton', '2021-02-15')]
+
+	after = store.report('esexton', None, '2/15/2021', '2/15/2021', 'gsa')
+	assert after.sales_total == pytest.approx(before.sales_total + 89.99)
+	assert after.customers == before.customers + 1
+	assert after.as_dict() == store.results('esexton', None, '2/15/2021', '2/15/2021', 'gsa').as_dict()